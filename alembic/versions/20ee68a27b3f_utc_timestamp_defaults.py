@@ -0,0 +1,33 @@
+"""utc timestamp defaults
+
+Revision ID: 20ee68a27b3f
+Revises: fd7d17a09169
+Create Date: 2026-10-19 21:02:37.418265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20ee68a27b3f'
+down_revision: Union[str, None] = 'fd7d17a09169'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite's CURRENT_TIMESTAMP is already UTC, Postgres now() follows the session time zone
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('account', 'data_updated_at', server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"))
+    op.alter_column('catalog_version', 'updated_at', server_default=sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)"))
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('account', 'data_updated_at', server_default=sa.func.now())
+    op.alter_column('catalog_version', 'updated_at', server_default=sa.func.now())
@@ -0,0 +1,135 @@
+"""transaction fingerprint
+
+Revision ID: f5d199975bbd
+Revises: e44e913dbd35
+Create Date: 2026-10-19 17:08:44.631920
+
+"""
+
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from database.models import transaction_fingerprint
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5d199975bbd'
+down_revision: Union[str, None] = 'e44e913dbd35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+transaction = sa.table(
+    'transaction',
+    sa.column('id', sa.Integer()),
+    sa.column('account_id', sa.Integer()),
+    sa.column('post_date', sa.DateTime()),
+    sa.column('description', sa.String()),
+    sa.column('amount', sa.Float()),
+    sa.column('occurrence', sa.Integer()),
+    sa.column('fingerprint', sa.String()),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column('occurrence', sa.Integer(), server_default='0', nullable=False)
+        )
+        batch_op.add_column(
+            sa.Column('fingerprint', sa.String(length=40), nullable=True)
+        )
+        batch_op.drop_constraint('_transaction_uc', type_='unique')
+
+    # Earlier imports marked in-file duplicates by appending "*" to the description,
+    # turn those into occurrence ordinals so re-imports of the same files match
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(
+            transaction.c.id,
+            transaction.c.account_id,
+            transaction.c.post_date,
+            transaction.c.description,
+            transaction.c.amount,
+        )
+    ).all()
+    stored = {
+        (account_id, post_date, description, amount)
+        for _, account_id, post_date, description, amount in rows
+    }
+    groups = defaultdict(list)
+    for row_id, account_id, post_date, description, amount in rows:
+        # Stars only count as markers when the unstarred row is stored too, real
+        # descriptions such as "SQ *CAFE*" can end in one
+        base = description
+        stars = len(description) - len(description.rstrip('*'))
+        for stripped in range(stars, 0, -1):
+            if (account_id, post_date, description[:-stripped], amount) in stored:
+                base = description[:-stripped]
+                break
+        groups[(account_id, post_date, base, amount)].append((len(description), row_id))
+
+    updates = []
+    for (_, post_date, base, amount), members in groups.items():
+        # Numbered in marker order, which also keeps every fingerprint in the group distinct
+        for occurrence, (_, row_id) in enumerate(sorted(members)):
+            updates.append(
+                {
+                    'row_id': row_id,
+                    'new_description': base,
+                    'new_occurrence': occurrence,
+                    'new_fingerprint': transaction_fingerprint(
+                        post_date, base, amount, occurrence
+                    ),
+                }
+            )
+    for start in range(0, len(updates), 5000):
+        connection.execute(
+            transaction.update()
+            .where(transaction.c.id == sa.bindparam('row_id'))
+            .values(
+                description=sa.bindparam('new_description'),
+                occurrence=sa.bindparam('new_occurrence'),
+                fingerprint=sa.bindparam('new_fingerprint'),
+            ),
+            updates[start : start + 5000],
+        )
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.alter_column(
+            'fingerprint', existing_type=sa.String(length=40), nullable=False
+        )
+        batch_op.create_unique_constraint(
+            '_transaction_fingerprint_uc', ['account_id', 'fingerprint']
+        )
+
+    # ### end Alembic commands ###
+
+
+def downgrade() -> None:
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_constraint('_transaction_fingerprint_uc', type_='unique')
+        batch_op.drop_column('fingerprint')
+
+    # ### end Alembic commands ###
+
+    # Restore the "*" markers the old unique constraint relies on
+    connection = op.get_bind()
+    connection.execute(
+        transaction.update()
+        .where(transaction.c.occurrence > 0)
+        .values(
+            description=transaction.c.description
+            + sa.func.substr('****************', 1, transaction.c.occurrence)
+        )
+    )
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_column('occurrence')
+        batch_op.create_unique_constraint(
+            '_transaction_uc', ['post_date', 'description', 'amount', 'account_id']
+        )
@@ -1,39 +1,107 @@
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime
+import io
+import logging
 import os
 from typing import Annotated, List
 
 import uvicorn
-from fastapi import Depends, FastAPI, HTTPException, UploadFile
+from fastapi import (
+    Depends,
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import Engine, create_engine, func, or_
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from backend import jobs, metrics
+from backend.balances import balance_on, record_transactions
+from backend.caching import (
+    account_version,
+    all_accounts_version,
+    catalog_version,
+    conditional_response,
+    touch_accounts,
+    touch_catalog,
+)
 from backend.csv import parse_csv
+from backend.duplicates import drop_known, find_near_duplicates
+from backend.export import (
+    MEDIA_TYPES,
+    ExportFormat,
+    ExportUnavailableException,
+    check_format,
+    export_transactions,
+)
 from backend.messages import (
     AccountData,
     ApplyRulesRequest,
     ApplyRulesResponse,
+    BalanceData,
     CategoryData,
+    GetBalanceHistoryResponse,
+    GetBalanceResponse,
     GetCategoriesResponse,
     GetTransactionsResponse,
+    GetUncategorizedResponse,
+    ImportResponse,
+    JobData,
+    NearDuplicateData,
     PostAccountRequest,
     PostCategoryRequest,
     SupercategoryData,
     TransactionData,
     TransactionUpdates,
+    UncategorizedGroup,
     UpdateTransactionRequest,
     UpdateTransactionResponse,
 )
+from backend.rules import apply_rule
+from backend.suggestions import (
+    Categorization,
+    record_categorizations,
+    transaction_messages,
+)
+from backend.triage import categorize_group, group_counts, uncategorized_page
+from database.engine import get_default_engine, serialized_write
 from database.models import (
     Account,
+    BalanceCheckpoint,
     Category,
+    Job,
     Rule,
     Supercategory,
     Transaction,
     TransactionFile,
 )
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Same page size as the triage queue's default
+PREVIEW_UNMATCHED_LIMIT = 50
+
+job_runner: jobs.JobRunner | None = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_runner
+    job_runner = jobs.JobRunner(
+        get_default_engine(), workers=int(os.environ.get("BUDGET_JOB_WORKERS", "1"))
+    )
+    job_runner.start()
+    yield
+    job_runner.stop()
+    job_runner = None
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = ["http://localhost:8000", "http://localhost:3000"]
 
@@ -45,30 +113,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if metrics.ENABLED:
+    metrics.install(app)
+
 
 @app.get("/")
 def root():
     return {"message": "Alive"}
 
 
-default_engine = None
-
-
-def get_default_engine():
-    global default_engine
-    if default_engine:
-        return default_engine
-    conn_string = os.environ.get("SQLALCHEMY_CONNECTION_STRING")
-    default_engine = create_engine(conn_string, future=True)
-    return default_engine
-
-
 async def session():
     session = Session(get_default_engine())
     try:
         yield session
     finally:
-        print("closing session")
+        logger.debug("closing session")
         session.close()
 
 
@@ -87,9 +146,14 @@ async def post_account(session: SessionDep, request: PostAccountRequest):
 
 
 @app.get("/accounts", response_model=List[AccountData])
-async def get_accounts(session: SessionDep):
+async def get_accounts(session: SessionDep, request: Request, response: Response):
     """Testing: curl localhost:8000/accounts"""
     with session.begin():
+        not_modified = conditional_response(
+            request, response, all_accounts_version(session)
+        )
+        if not_modified:
+            return not_modified
         accounts: List[Account] = session.query(Account).all()
         convert_to_message = lambda account: AccountData.model_validate(
             account, from_attributes=True
@@ -97,45 +161,80 @@ async def get_accounts(session: SessionDep):
         return map(convert_to_message, accounts)
 
 
-@app.post("/account/{account_id}/import")
+@app.post("/account/{account_id}/import", response_model=ImportResponse)
 async def import_csv(account_id: int, uploadFile: UploadFile, session: SessionDep):
     """Testing: curl -L -F "uploadFile=@test_data/sensitive/sample_transactions_checking.CSV" http://localhost:8000/account/1/import"""
     with uploadFile.file as binaryFile:
+        data = binaryFile.read()
 
-        # Persist file for reference.
-        with session.begin():
-            # TODO: Short-circuit if the file already exists (unique constraint maybe?)
-            file = TransactionFile(
-                filename=uploadFile.filename,
-                data=binaryFile.read(),
-            )
-            session.add(file)
-            session.commit()
+    return await serialized_write(
+        session.get_bind(), _import_csv, session, account_id, uploadFile.filename, data
+    )
+
+
+def _import_csv(session: Session, account_id: int, filename: str, data: bytes):
+    # Persist file for reference.
+    with metrics.timer("import_store_file"), session.begin():
+        # TODO: Short-circuit if the file already exists (unique constraint maybe?)
+        file = TransactionFile(filename=filename, data=data)
+        session.add(file)
+        session.commit()
 
-        # Secondarily, parse file
-        binaryFile.seek(0)
-        with session.begin():
-            transactions = parse_csv(binaryFile)
-            for transaction in transactions:
-                # TODO: Check to see if the transactions already exist!
+    # Secondarily, parse file
+    with session.begin():
+        with metrics.timer("parse_csv"):
+            transactions = parse_csv(io.BytesIO(data))
+        with metrics.timer("import_dedupe"):
+            new_transactions, skipped = drop_known(session, account_id, transactions)
+            near_duplicates = find_near_duplicates(
+                session, account_id, new_transactions
+            )
+        with metrics.timer("import_insert"):
+            for transaction in new_transactions:
                 transaction.account_id = account_id
+                transaction.source_file_id = file.id
                 session.add(transaction)
+            record_transactions(session, account_id, new_transactions, transactions)
+            touch_accounts(session, account_id)
+            session.flush()
+            result = ImportResponse(
+                description=transactions[0].description if transactions else None,
+                total=len(transactions),
+                added=len(new_transactions),
+                skipped=skipped,
+                possible_duplicates=[
+                    NearDuplicateData(
+                        transaction=TransactionData.model_validate(
+                            duplicate.transaction, from_attributes=True
+                        ),
+                        existing_id=duplicate.matched.id,
+                    )
+                    for duplicate in near_duplicates
+                ],
+            )
             session.commit()
 
-        # TODO: Return a summary of the operations performed (# added, # skipped)
-        return {"description": transactions[0].description, "total": len(transactions)}
+    return result
 
 
 @app.get("/account/{account_id}/transactions", response_model=GetTransactionsResponse)
 async def get_transactions(
     session: SessionDep,
+    request: Request,
+    response: Response,
     account_id: int,
     page: int = 0,
     per_page: int = 20,
 ):
 
-    # Persist file for reference.
     with session.begin():
+        version = account_version(session, account_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        not_modified = conditional_response(request, response, version)
+        if not_modified:
+            return not_modified
+
         transactions = (
             session.query(Transaction)
             .filter(Transaction.account_id == account_id)
@@ -144,16 +243,147 @@ async def get_transactions(
             .limit(per_page)
             .all()
         )
+        transactionData = transaction_messages(session, account_id, transactions)
 
-    transactionData = [
-        TransactionData.model_validate(transaction, from_attributes=True)
-        for transaction in transactions
-    ]
     return GetTransactionsResponse(
         transactions=transactionData, page=page, per_page=per_page
     )
 
 
+@app.get("/account/{account_id}/uncategorized", response_model=GetUncategorizedResponse)
+async def get_uncategorized(
+    session: SessionDep,
+    request: Request,
+    response: Response,
+    account_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    after_date: datetime | None = None,
+    after_id: int | None = None,
+):
+    """Triage queue: uncategorized, unverified transactions with the size of each description group"""
+    if (after_date is None) != (after_id is None):
+        raise HTTPException(
+            status_code=400, detail="after_date and after_id must be given together"
+        )
+    with session.begin():
+        version = account_version(session, account_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        not_modified = conditional_response(request, response, version)
+        if not_modified:
+            return not_modified
+
+        transactions = uncategorized_page(
+            session, account_id, limit, after_date, after_id
+        )
+        counts = group_counts(
+            session,
+            account_id,
+            [transaction.description_key for transaction in transactions],
+        )
+
+        page = GetUncategorizedResponse(
+            transactions=transaction_messages(session, account_id, transactions),
+            groups=[
+                UncategorizedGroup(description_key=description_key, count=count)
+                for description_key, count in sorted(
+                    counts.items(), key=lambda group: (-group[1], group[0])
+                )
+            ],
+        )
+        if len(transactions) == limit:
+            page.next_after_date = transactions[-1].post_date
+            page.next_after_id = transactions[-1].id
+        return page
+
+
+@app.get("/account/{account_id}/balance", response_model=GetBalanceResponse)
+async def get_balance(
+    session: SessionDep,
+    request: Request,
+    response: Response,
+    account_id: int,
+    on: date,
+):
+    with session.begin():
+        version = account_version(session, account_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        not_modified = conditional_response(request, response, version)
+        if not_modified:
+            return not_modified
+
+        checkpoint = balance_on(session, account_id, on)
+        if checkpoint is None:
+            # Before the first transaction
+            opening_balance = session.get_one(Account, account_id).opening_balance
+            return GetBalanceResponse(on=on, balance=opening_balance)
+        return GetBalanceResponse(
+            on=on, balance=checkpoint.balance, as_of=checkpoint.day
+        )
+
+
+@app.get("/account/{account_id}/balances", response_model=GetBalanceHistoryResponse)
+async def get_balance_history(
+    session: SessionDep,
+    request: Request,
+    response: Response,
+    account_id: int,
+    start: date | None = None,
+    end: date | None = None,
+):
+    """End-of-day balances for charting, one point per day with activity"""
+    with session.begin():
+        version = account_version(session, account_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        not_modified = conditional_response(request, response, version)
+        if not_modified:
+            return not_modified
+
+        query = session.query(BalanceCheckpoint).filter(
+            BalanceCheckpoint.account_id == account_id
+        )
+        opening_balance = session.get_one(Account, account_id).opening_balance
+        if start:
+            query = query.filter(BalanceCheckpoint.day >= start)
+            carried_in = balance_on(
+                session, account_id, date.fromordinal(start.toordinal() - 1)
+            )
+            if carried_in:
+                opening_balance = carried_in.balance
+        if end:
+            query = query.filter(BalanceCheckpoint.day <= end)
+        checkpoints = query.order_by(BalanceCheckpoint.day.asc()).all()
+
+        return GetBalanceHistoryResponse(
+            opening_balance=opening_balance,
+            balances=[
+                BalanceData.model_validate(checkpoint, from_attributes=True)
+                for checkpoint in checkpoints
+            ],
+        )
+
+
+@app.get("/account/{account_id}/export")
+async def export(session: SessionDep, account_id: int, format: ExportFormat = "csv"):
+    """Testing: curl -o export.parquet localhost:8000/account/1/export?format=parquet"""
+    with session.begin():
+        if session.get(Account, account_id) is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+    try:
+        check_format(format)
+    except ExportUnavailableException as exc:
+        raise HTTPException(status_code=501, detail=str(exc))
+
+    filename = f"account-{account_id}-transactions.{format}"
+    return StreamingResponse(
+        export_transactions(session.get_bind(), account_id, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @app.put("/transactions", response_model=UpdateTransactionResponse)
 async def update_transaction(session: SessionDep, request: UpdateTransactionRequest):
     # Persist file for reference.
@@ -180,6 +410,7 @@ async def update_transaction(session: SessionDep, request: UpdateTransactionRequ
                 detail="Cannot change transaction fields outside of category and verified",
             )
 
+        old_category_id = transaction.category_id
         if request.newCategoryName:
             if request.newSuperName:
                 # Create new category AND new super
@@ -204,8 +435,30 @@ async def update_transaction(session: SessionDep, request: UpdateTransactionRequ
         if request.transaction.verified_at:
             transaction.verified_at = request.transaction.verified_at
 
+        if request.newCategoryName:
+            touch_catalog(session)
+        touch_accounts(session, transaction.account_id)
         session.flush()
-        result = TransactionData.model_validate(transaction, from_attributes=True)
+        record_categorizations(
+            session,
+            transaction.account_id,
+            [
+                Categorization(
+                    transaction.description_key,
+                    old_category_id,
+                    transaction.category_id,
+                )
+            ],
+        )
+
+        group_updated = 0
+        if request.apply_to_group and transaction.category_id is not None:
+            group_updated = categorize_group(session, transaction)
+
+        result = UpdateTransactionResponse.model_validate(
+            transaction, from_attributes=True
+        )
+        result.group_updated = group_updated
 
     return result
 
@@ -213,10 +466,15 @@ async def update_transaction(session: SessionDep, request: UpdateTransactionRequ
 @app.get("/categories", response_model=GetCategoriesResponse)
 async def getCategories(
     session: SessionDep,
+    request: Request,
+    response: Response,
 ):
 
-    # Persist file for reference.
     with session.begin():
+        not_modified = conditional_response(request, response, catalog_version(session))
+        if not_modified:
+            return not_modified
+
         categories = session.query(Category).order_by(Category.name.asc()).all()
 
         categoryData = [
@@ -252,9 +510,13 @@ async def post_category(session: SessionDep, request: PostCategoryRequest):
             new_category.supercategory = new_supercategory
 
         session.add(new_category)
+        touch_catalog(session)
+        session.flush()
+        session.refresh(new_category)
+        result = CategoryData.model_validate(new_category, from_attributes=True)
         session.commit()
 
-    return AccountData.model_validate(new_category, from_attributes=True)
+    return result
 
 
 @app.put("/category", response_model=CategoryData)
@@ -270,16 +532,16 @@ async def update_category(session: SessionDep, request: CategoryData):
             session.delete(rule)
 
         for rule in request.rules:
-            print(rule)
             new_rule = Rule(
                 contains=rule.contains,
                 case_sensitive=rule.case_sensitive,
                 account_id=rule.account_id,
                 category=category,
             )
-            print(new_rule)
+            logger.debug("replacing rules for category %s: %s", category.id, rule)
             session.add(new_rule)
 
+        touch_catalog(session)
         session.flush()
         session.refresh(category)
         result = CategoryData.model_validate(category, from_attributes=True)
@@ -290,48 +552,98 @@ async def update_category(session: SessionDep, request: CategoryData):
 
 @app.post("/account/{account_id}/apply-rules", response_model=ApplyRulesResponse)
 async def apply_rules(account_id: int, request: ApplyRulesRequest, session: SessionDep):
+    return await serialized_write(
+        session.get_bind(), _apply_rules, session, account_id, request.preview
+    )
+
+
+def _apply_rules(session: Session, account_id: int, preview: bool):
     updated_transactions: List[TransactionUpdates] = []
-    with session.begin():
+    unmatched_transactions: List[TransactionData] = []
+    with metrics.timer("apply_rules"), session.begin():
         rules = session.query(Rule).order_by(Rule.id.asc()).all()
 
         # For each rule, for each transaction, update the category if the contains clause matches
         for rule in rules:
-            if rule.category_id is None:
-                print(f"Invalid rule {rule.id} with contains ${rule.contains}")
-                continue
-            filter_clause = []
-            filter_clause.append(Transaction.account_id == account_id)
-            filter_clause.append(
-                or_(
-                    Transaction.category_id != rule.category_id,
-                    Transaction.category_id == None,
-                )
-            )
-            filter_clause.append(
-                Transaction.description.like(f"%{rule.contains}%")
-                if rule.case_sensitive
-                else Transaction.description.ilike(f"%{rule.contains}%")
+            updated_transactions.extend(apply_rule(session, account_id, rule))
+        if preview:
+            # What the rules leave uncategorized, ranked against the index as it would be after them
+            unmatched_transactions = transaction_messages(
+                session,
+                account_id,
+                uncategorized_page(session, account_id, PREVIEW_UNMATCHED_LIMIT),
             )
-            records_to_update = session.query(Transaction).filter(*filter_clause).all()
-            for record in records_to_update:
-                updated_transactions.append(
-                    TransactionUpdates(
-                        transaction=TransactionData.model_validate(
-                            record, from_attributes=True
-                        ),
-                        old_category=(
-                            record.category.name if record.category else "None"
-                        ),
-                        new_category=rule.category.name,
-                    )
-                )
-
-                record.category_id = rule.category_id
-        if request.preview:
             session.rollback()
         else:
+            if updated_transactions:
+                touch_accounts(session, account_id)
             session.commit()
-    return ApplyRulesResponse(updated_transactions=updated_transactions)
+    return ApplyRulesResponse(
+        updated_transactions=updated_transactions,
+        unmatched_transactions=unmatched_transactions,
+    )
+
+
+@app.post("/account/{account_id}/jobs/import", response_model=JobData, status_code=202)
+async def enqueue_import(account_id: int, uploadFile: UploadFile, session: SessionDep):
+    """Like /account/{account_id}/import, but returns a job id immediately and imports in the background"""
+    with uploadFile.file as binaryFile:
+        data = binaryFile.read()
+
+    with session.begin():
+        if session.get(Account, account_id) is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        file = TransactionFile(filename=uploadFile.filename, data=data)
+        session.add(file)
+        job = jobs.enqueue_import(session, account_id, file)
+        session.flush()
+        result = JobData.model_validate(job, from_attributes=True)
+
+    if job_runner:
+        job_runner.notify()
+    return result
+
+
+@app.post(
+    "/account/{account_id}/jobs/apply-rules", response_model=JobData, status_code=202
+)
+async def enqueue_apply_rules(account_id: int, session: SessionDep):
+    with session.begin():
+        if session.get(Account, account_id) is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        job = jobs.enqueue_apply_rules(session, account_id)
+        session.flush()
+        result = JobData.model_validate(job, from_attributes=True)
+
+    if job_runner:
+        job_runner.notify()
+    return result
+
+
+@app.get("/jobs/{job_id}", response_model=JobData)
+async def get_job(job_id: int, session: SessionDep):
+    with session.begin():
+        job = session.get(Job, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Cannot find job")
+        return JobData.model_validate(job, from_attributes=True)
+
+
+@app.get("/account/{account_id}/jobs", response_model=List[JobData])
+async def get_jobs(account_id: int, session: SessionDep):
+    with session.begin():
+        if session.get(Account, account_id) is None:
+            raise HTTPException(status_code=404, detail="Cannot find account")
+        account_jobs = (
+            session.query(Job)
+            .filter(Job.account_id == account_id)
+            .order_by(Job.id.desc())
+            .limit(50)
+            .all()
+        )
+        return [
+            JobData.model_validate(job, from_attributes=True) for job in account_jobs
+        ]
 
 
 def start():
@@ -0,0 +1,209 @@
+### Running balance checkpoints per account and day
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from database.models import Account, BalanceCheckpoint, Transaction
+
+# Differences below half a cent are float noise, not a real discrepancy
+CALIBRATION_TOLERANCE = 0.005
+
+
+def _daily_totals(transactions: List[Transaction]) -> Dict[date, float]:
+    totals: Dict[date, float] = defaultdict(float)
+    for transaction in transactions:
+        totals[transaction.post_date.date()] += float(transaction.amount)
+    return totals
+
+
+def balance_on(
+    session: Session, account_id: int, day: date
+) -> BalanceCheckpoint | None:
+    """Latest checkpoint at or before `day`, a single index seek on the primary key"""
+    return session.scalars(
+        select(BalanceCheckpoint)
+        .where(BalanceCheckpoint.account_id == account_id, BalanceCheckpoint.day <= day)
+        .order_by(BalanceCheckpoint.day.desc())
+        .limit(1)
+    ).first()
+
+
+def _reported_days(session: Session, account_id: int) -> List[date]:
+    return list(
+        session.scalars(
+            select(BalanceCheckpoint.day)
+            .where(
+                BalanceCheckpoint.account_id == account_id,
+                BalanceCheckpoint.reported == True,
+            )
+            .order_by(BalanceCheckpoint.day.asc())
+        )
+    )
+
+
+def add_to_checkpoints(
+    session: Session, account_id: int, transactions: List[Transaction]
+):
+    """Fold newly inserted transactions into the checkpoints, in any date order
+
+    Days pinned to a reported balance never move. Days after a pinned day follow on from it, days
+    before the first pinned day are worked back from it, which moves the opening balance instead.
+    """
+    deltas = _daily_totals(transactions)
+    if not deltas:
+        return
+    account = session.get_one(Account, account_id)
+    reported_days = _reported_days(session, account_id)
+
+    # A segment runs from just after one pinned day up to and including the next
+    segments: Dict[int, Dict[date, float]] = defaultdict(dict)
+    for day, delta in deltas.items():
+        segments[bisect_left(reported_days, day)][day] = delta
+    for index, segment in sorted(segments.items()):
+        next_reported = reported_days[index] if index < len(reported_days) else None
+        _add_to_segment(
+            session,
+            account,
+            segment,
+            next_reported,
+            backward=index == 0 and next_reported is not None,
+        )
+
+
+def _add_to_segment(
+    session: Session,
+    account: Account,
+    deltas: Dict[date, float],
+    next_reported: date | None,
+    backward: bool,
+):
+    first_day, last_day = min(deltas), max(deltas)
+    # Worked back from a pinned day, every earlier day (and the opening) drops by the whole segment
+    running_delta = -sum(deltas.values()) if backward else 0.0
+    if backward:
+        account.opening_balance += running_delta
+        session.execute(
+            update(BalanceCheckpoint)
+            .where(
+                BalanceCheckpoint.account_id == account.id,
+                BalanceCheckpoint.day < first_day,
+            )
+            .values(balance=BalanceCheckpoint.balance + running_delta)
+        )
+
+    carried_in = balance_on(
+        session, account.id, date.fromordinal(first_day.toordinal() - 1)
+    )
+    previous_balance = carried_in.balance if carried_in else account.opening_balance
+
+    existing = {
+        checkpoint.day: checkpoint
+        for checkpoint in session.scalars(
+            select(BalanceCheckpoint).where(
+                BalanceCheckpoint.account_id == account.id,
+                BalanceCheckpoint.day >= first_day,
+                BalanceCheckpoint.day <= last_day,
+            )
+        )
+    }
+
+    for day in sorted(set(existing) | set(deltas)):
+        running_delta += deltas.get(day, 0.0)
+        checkpoint = existing.get(day)
+        if checkpoint is None:
+            checkpoint = BalanceCheckpoint(
+                account_id=account.id,
+                day=day,
+                balance=previous_balance + deltas[day],
+            )
+            session.add(checkpoint)
+        elif not checkpoint.reported:
+            checkpoint.balance += running_delta
+        previous_balance = checkpoint.balance
+
+    if not running_delta:
+        return
+    # Every later day up to the next pinned one shifts by the same total, so one statement covers them
+    later = update(BalanceCheckpoint).where(
+        BalanceCheckpoint.account_id == account.id,
+        BalanceCheckpoint.day > last_day,
+    )
+    if next_reported is not None:
+        later = later.where(BalanceCheckpoint.day < next_reported)
+    session.execute(later.values(balance=BalanceCheckpoint.balance + running_delta))
+
+
+def reported_end_of_day(transactions: List[Transaction]) -> Dict[date, float]:
+    """End-of-day balances as reported by the bank, for rows in file order"""
+    rows = [
+        transaction for transaction in transactions if transaction.balance is not None
+    ]
+    if not rows:
+        return {}
+    # Exports list newest first or oldest first; the end of a day is whichever row comes last in time
+    if rows[0].post_date > rows[-1].post_date:
+        rows = list(reversed(rows))
+    return {transaction.post_date.date(): transaction.balance for transaction in rows}
+
+
+def calibrate_checkpoints(
+    session: Session, account_id: int, reported: Dict[date, float]
+):
+    """Pin the latest day the bank reported a balance for, moving the days that derive from it"""
+    if not reported:
+        return
+    day = max(reported)
+    checkpoint = session.get(BalanceCheckpoint, (account_id, day))
+    if checkpoint is None:
+        return
+    offset = reported[day] - checkpoint.balance
+    checkpoint.reported = True
+    if abs(offset) < CALIBRATION_TOLERANCE:
+        return
+    checkpoint.balance = reported[day]
+
+    other_days = [
+        reported_day
+        for reported_day in _reported_days(session, account_id)
+        if reported_day != day
+    ]
+    next_reported = min(
+        (reported_day for reported_day in other_days if reported_day > day),
+        default=None,
+    )
+    later = update(BalanceCheckpoint).where(
+        BalanceCheckpoint.account_id == account_id, BalanceCheckpoint.day > day
+    )
+    if next_reported is not None:
+        later = later.where(BalanceCheckpoint.day < next_reported)
+    session.execute(later.values(balance=BalanceCheckpoint.balance + offset))
+
+    # Without an earlier pinned day, earlier balances are worked back from this one
+    if not any(reported_day < day for reported_day in other_days):
+        session.get_one(Account, account_id).opening_balance += offset
+        session.execute(
+            update(BalanceCheckpoint)
+            .where(
+                BalanceCheckpoint.account_id == account_id,
+                BalanceCheckpoint.day < day,
+            )
+            .values(balance=BalanceCheckpoint.balance + offset)
+        )
+
+
+def record_transactions(
+    session: Session,
+    account_id: int,
+    transactions: List[Transaction],
+    file_rows: List[Transaction] | None = None,
+):
+    """`file_rows` is the whole parsed file, including duplicates that were skipped on import"""
+    add_to_checkpoints(session, account_id, transactions)
+    calibrate_checkpoints(
+        session, account_id, reported_end_of_day(file_rows or transactions)
+    )
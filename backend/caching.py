@@ -0,0 +1,117 @@
+### Conditional GET support for read endpoints
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from database.models import Account, CatalogVersion
+
+Version = Tuple[str, datetime | None]
+
+
+def _utcnow() -> datetime:
+    # Stored naive and in UTC, like the database.models.utcnow server defaults
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def touch_accounts(session: Session, account_id: int):
+    """Advance the data version of an account after its transactions change"""
+    session.execute(
+        update(Account)
+        .where(Account.id == account_id)
+        .values(data_version=Account.data_version + 1, data_updated_at=_utcnow())
+    )
+
+
+def touch_catalog(session: Session):
+    """Advance the shared version of categories, supercategories and rules"""
+    session.execute(
+        update(CatalogVersion).values(
+            version=CatalogVersion.version + 1, updated_at=_utcnow()
+        )
+    )
+
+
+def account_version(session: Session, account_id: int) -> Version | None:
+    row = session.execute(
+        select(Account.data_version, Account.data_updated_at).where(
+            Account.id == account_id
+        )
+    ).first()
+    if row is None:
+        return None
+    return f"account-{account_id}-v{row.data_version}", row.data_updated_at
+
+
+def all_accounts_version(session: Session) -> Version:
+    """Aggregate version over every account; changes when an account is added or any account is touched"""
+    row = session.execute(
+        select(
+            func.count(Account.id),
+            func.max(Account.id),
+            func.coalesce(func.sum(Account.data_version), 0),
+            func.max(Account.data_updated_at),
+        )
+    ).one()
+    count, max_id, version_sum, updated_at = row
+    return f"accounts-{count}-{max_id}-v{version_sum}", updated_at
+
+
+def catalog_version(session: Session) -> Version:
+    row = session.execute(
+        select(CatalogVersion.version, CatalogVersion.updated_at)
+    ).one()
+    return f"catalog-v{row.version}", row.updated_at
+
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+
+def _not_modified_since(request: Request, last_modified: datetime) -> bool:
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # The header only has whole seconds. An edit later within the same second goes unnoticed
+    # here, which is why If-None-Match, checked first, is the authoritative validator
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+
+def conditional_response(
+    request: Request, response: Response, version: Version
+) -> Response | None:
+    """Set caching headers on the outgoing response, returning a bare 304 if the client copy is current"""
+    tag, last_modified = version
+    etag = f'W/"{tag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, so strip any W/ prefix before matching
+        candidates = [
+            candidate.strip().removeprefix("W/")
+            for candidate in if_none_match.split(",")
+        ]
+        not_modified = "*" in candidates or f'"{tag}"' in candidates
+    else:
+        not_modified = last_modified is not None and _not_modified_since(
+            request, last_modified
+        )
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from backend import app as app_module
+from database import engine as engine_module
+from database.models import Account, Base, Category, Supercategory, Transaction
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    # StaticPool shares the single in-memory database between the test and the app
+    engine = create_engine(
+        "sqlite+pysqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(engine_module, "default_engine", engine)
+    return engine
+
+
+@pytest.fixture
+def client(engine):
+    return TestClient(app_module.app)
+
+
+@pytest.fixture
+def account_id(engine):
+    with Session(engine) as session:
+        account = Account(name="checking", group="household")
+        groceries = Category(name="Groceries", supercategory=Supercategory(name="Food"))
+        session.add_all([account, groceries])
+        session.flush()
+        session.add_all(
+            [
+                Transaction(
+                    post_date=datetime(2024, 8, day),
+                    description=f"GROCER #{day}",
+                    amount=-10.0 * day,
+                    account=account,
+                )
+                for day in range(1, 4)
+            ]
+        )
+        session.commit()
+        return account.id
@@ -3,14 +3,18 @@
 # TODO move to test file
 import codecs
 import csv
+import logging
 from datetime import date, datetime
-from typing import BinaryIO, Dict, List
+from typing import BinaryIO, Dict, List, Tuple
 
 from sqlalchemy import Enum
 from sqlalchemy.orm import Session
 
+from backend import metrics
 from database.models import Account, Transaction
 
+logger = logging.getLogger(__name__)
+
 
 class Headers(Enum):
     # Essential fields
@@ -47,7 +51,7 @@ class ConflictingHeaderException(Exception):
 def add_transactions(
     session: Session, account: Account | None, records: List[Transaction]
 ):
-    with session.begin() as transaction:
+    with metrics.timer("add_transactions"), session.begin() as transaction:
         for record in records:
             record.account = account
             session.add(record)
@@ -66,7 +70,7 @@ def parse_header_line(keys: List[str]) -> HeaderMapping:
         elif header_key:
             headers[header_key] = idx
         else:
-            print(f"Ignoring unrecognized header: {key}")
+            logger.info("Ignoring unrecognized header: %s", key)
     return headers
 
 
@@ -80,12 +84,15 @@ def parse_transaction(headers: HeaderMapping, line: List[str]):
     new_record = Transaction(
         post_date=_parse_date(line[headers[Headers.POST_DATE]]),
         description=line[headers[Headers.DESCRIPTION]],
-        amount=line[headers[Headers.AMOUNT]],
+        amount=float(line[headers[Headers.AMOUNT]]),
     )
 
     # Parse optional fields if present
     if Headers.INIT_DATE in headers:
         new_record.init_date = _parse_date(line[headers[Headers.INIT_DATE]])
+    # Pending rows are often exported without a balance
+    if Headers.BALANCE in headers and line[headers[Headers.BALANCE]].strip():
+        new_record.balance = float(line[headers[Headers.BALANCE]])
 
     return new_record
 
@@ -95,16 +102,18 @@ def parse_csv(file: BinaryIO) -> List[Transaction]:
     transactions: List[Transaction] = []
     textFile = codecs.getreader("utf-8")(file)
     csv_reader = csv.reader(textFile, delimiter=",", quotechar='"')
-    unique_transaction_set = set()
+    # Identical rows within one file (e.g. repeated fees) are numbered instead of collapsed
+    occurrences: Dict[Tuple[datetime, str, float], int] = {}
     for line_number, line in enumerate(csv_reader):
         if line_number == 0:
             headers = parse_header_line(line)
         elif len(line) < 1:
-            print(f"Unexpected empty line in CSV at line {line_number}")
+            logger.warning("Unexpected empty line in CSV at line %s", line_number)
         else:
             transaction = parse_transaction(headers, line)
-            while transaction.unique_string in unique_transaction_set:
-                transaction.description += "*"
-            unique_transaction_set.add(transaction.unique_string)
+            key = (transaction.post_date, transaction.description, transaction.amount)
+            transaction.occurrence = occurrences.get(key, 0)
+            occurrences[key] = transaction.occurrence + 1
+            transaction.fingerprint = transaction.compute_fingerprint()
             transactions.append(transaction)
     return transactions
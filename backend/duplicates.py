@@ -0,0 +1,103 @@
+### Duplicate detection for imports, against rows already stored for the account
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database.models import Transaction, description_tokens
+
+# Keeps IN lists well under the bind parameter limits of both dialects
+LOOKUP_CHUNK_SIZE = 1000
+# Pending card transactions usually post within a few days under the same amount
+NEAR_DUPLICATE_WINDOW = timedelta(days=3)
+# Word some banks put in the description of a transaction that hasn't posted yet
+PENDING_MARKER = "pending"
+
+
+@dataclass
+class NearDuplicate:
+    transaction: Transaction
+    # A stored row, or an earlier row of the same import (its id is known once flushed)
+    matched: Transaction
+
+
+def _chunks(transactions: List[Transaction]):
+    for start in range(0, len(transactions), LOOKUP_CHUNK_SIZE):
+        yield transactions[start : start + LOOKUP_CHUNK_SIZE]
+
+
+def drop_known(
+    session: Session, account_id: int, transactions: List[Transaction]
+) -> Tuple[List[Transaction], int]:
+    """Split off rows whose fingerprint is already stored, one indexed lookup per chunk"""
+    new_transactions: List[Transaction] = []
+    for chunk in _chunks(transactions):
+        known = set(
+            session.scalars(
+                select(Transaction.fingerprint).where(
+                    Transaction.account_id == account_id,
+                    Transaction.fingerprint.in_(
+                        {transaction.fingerprint for transaction in chunk}
+                    ),
+                )
+            )
+        )
+        new_transactions.extend(
+            transaction for transaction in chunk if transaction.fingerprint not in known
+        )
+    return new_transactions, len(transactions) - len(new_transactions)
+
+
+def _merchant_tokens(transaction: Transaction) -> Set[str]:
+    return set(description_tokens(transaction.description_key)) - {PENDING_MARKER}
+
+
+def _looks_like_pair(transaction: Transaction, other: Transaction) -> bool:
+    if abs(other.post_date - transaction.post_date) > NEAR_DUPLICATE_WINDOW:
+        return False
+    # The same description again is a repeated charge, like a daily coffee, not a pending/posted pair
+    if other.description == transaction.description:
+        return False
+    # Otherwise both should name the same merchant, whether or not one is marked pending
+    return bool(_merchant_tokens(transaction) & _merchant_tokens(other))
+
+
+def find_near_duplicates(
+    session: Session, account_id: int, transactions: List[Transaction]
+) -> List[NearDuplicate]:
+    """Flag new rows with a stored or earlier imported row of the same amount a few days apart"""
+    earlier: Dict[float, List[Transaction]] = defaultdict(list)
+    flagged: List[NearDuplicate] = []
+    for chunk in _chunks(transactions):
+        earliest = min(transaction.post_date for transaction in chunk)
+        latest = max(transaction.post_date for transaction in chunk)
+        stored: Dict[float, List[Transaction]] = defaultdict(list)
+        for row in session.scalars(
+            select(Transaction).where(
+                Transaction.account_id == account_id,
+                Transaction.amount.in_({transaction.amount for transaction in chunk}),
+                Transaction.post_date >= earliest - NEAR_DUPLICATE_WINDOW,
+                Transaction.post_date <= latest + NEAR_DUPLICATE_WINDOW,
+            )
+        ):
+            stored[row.amount].append(row)
+
+        for transaction in chunk:
+            # Pending/posted pairs inside one file are compared too, each pair flagged once
+            matches = [
+                other
+                for other in stored[transaction.amount] + earlier[transaction.amount]
+                if _looks_like_pair(transaction, other)
+            ]
+            if matches:
+                closest = min(
+                    matches,
+                    key=lambda other: abs(other.post_date - transaction.post_date),
+                )
+                flagged.append(NearDuplicate(transaction, closest))
+            earlier[transaction.amount].append(transaction)
+    return flagged
@@ -0,0 +1,173 @@
+### Streaming bulk export of an account's transactions
+#
+# Rows come off a server-side cursor in batches and are encoded batch by batch, so memory stays
+# flat whatever the size of the account. Parquet and Arrow need the optional pyarrow dependency
+# (`poetry install -E export`).
+
+import csv
+import io
+from typing import Iterator, List, Literal, Sequence
+
+from sqlalchemy import Engine, Row, select
+from sqlalchemy.orm import aliased
+
+from database.models import Category, Supercategory, Transaction
+
+BATCH_SIZE = 5000
+
+COLUMNS = [
+    "id",
+    "post_date",
+    "init_date",
+    "description",
+    "amount",
+    "balance",
+    "verified_at",
+    "category",
+    "supercategory",
+]
+
+ExportFormat = Literal["csv", "parquet", "arrow"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class ExportUnavailableException(Exception):
+    pass
+
+
+def _export_query(account_id: int):
+    category = aliased(Category)
+    supercategory = aliased(Supercategory)
+    return (
+        select(
+            Transaction.id,
+            Transaction.post_date,
+            Transaction.init_date,
+            Transaction.description,
+            Transaction.amount,
+            Transaction.balance,
+            Transaction.verified_at,
+            category.name,
+            supercategory.name,
+        )
+        .outerjoin(category, Transaction.category_id == category.id)
+        .outerjoin(supercategory, category.supercategory_id == supercategory.id)
+        .where(Transaction.account_id == account_id)
+        .order_by(Transaction.post_date.asc(), Transaction.id.asc())
+    )
+
+
+def _batches(engine: Engine, account_id: int) -> Iterator[Sequence[Row]]:
+    # Opens its own connection: the request session is closed before a streamed body is sent
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, yield_per=BATCH_SIZE
+        ).execute(_export_query(account_id))
+        for batch in result.partitions():
+            yield batch
+
+
+def _csv_stream(engine: Engine, account_id: int) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quotechar='"', lineterminator="\n")
+    writer.writerow(COLUMNS)
+    for batch in _batches(engine, account_id):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write target for pyarrow that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_stream(
+    engine: Engine, account_id: int, format: ExportFormat
+) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [
+            ("id", pa.int64()),
+            ("post_date", pa.timestamp("us")),
+            ("init_date", pa.timestamp("us")),
+            ("description", pa.string()),
+            ("amount", pa.float64()),
+            ("balance", pa.float64()),
+            ("verified_at", pa.timestamp("us")),
+            ("category", pa.string()),
+            ("supercategory", pa.string()),
+        ]
+    )
+    sink = _ChunkSink()
+    if format == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+        write = writer.write_table
+        to_output = lambda batch: pa.Table.from_batches([batch])
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+        write = writer.write_batch
+        to_output = lambda batch: batch
+
+    for rows in _batches(engine, account_id):
+        # Each batch becomes one Parquet row group / one IPC record batch
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [
+                pa.array(column, type=field.type)
+                for column, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+        write(to_output(batch))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def check_format(format: ExportFormat):
+    """Raise before streaming starts, a failure mid-body can't change the status code"""
+    if format in ("parquet", "arrow"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise ExportUnavailableException(
+                f"{format} export requires the optional pyarrow dependency"
+            ) from exc
+
+
+def export_transactions(
+    engine: Engine, account_id: int, format: ExportFormat
+) -> Iterator[bytes]:
+    check_format(format)
+    if format == "csv":
+        return _csv_stream(engine, account_id)
+    return _arrow_stream(engine, account_id, format)
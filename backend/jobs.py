@@ -0,0 +1,232 @@
+### Background job runner for imports and rule application
+#
+# Jobs live in the `job` table, so a restart picks up where the last committed chunk left off.
+# Each chunk commits its rows together with the job checkpoint, which is what makes the resume
+# exact: a crash mid-chunk rolls both back.
+
+import io
+import logging
+import threading
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import Engine, select, update
+from sqlalchemy.orm import Session
+
+from backend import metrics
+from backend.balances import (
+    add_to_checkpoints,
+    calibrate_checkpoints,
+    reported_end_of_day,
+)
+from backend.caching import touch_accounts
+from backend.csv import parse_csv
+from backend.duplicates import drop_known
+from backend.rules import apply_rule
+from database.engine import serialized_write_sync
+from database.models import Job, Rule, Transaction, TransactionFile
+
+logger = logging.getLogger(__name__)
+
+IMPORT = "import"
+APPLY_RULES = "apply_rules"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+IMPORT_CHUNK_SIZE = 1000
+RULE_CHUNK_SIZE = 10
+POLL_SECONDS = 5.0
+SHUTDOWN_SECONDS = 30.0
+
+
+def enqueue_import(session: Session, account_id: int, file: TransactionFile) -> Job:
+    job = Job(kind=IMPORT, status=QUEUED, account_id=account_id, source_file=file)
+    session.add(job)
+    return job
+
+
+def enqueue_apply_rules(session: Session, account_id: int) -> Job:
+    job = Job(kind=APPLY_RULES, status=QUEUED, account_id=account_id)
+    session.add(job)
+    return job
+
+
+class JobRunner:
+    """Worker threads that claim queued jobs from the database and run them chunk by chunk"""
+
+    def __init__(self, engine: Engine, workers: int = 1):
+        self.engine = engine
+        self.workers = workers
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        self.requeue_interrupted()
+        for idx in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"job-worker-{idx}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            # Workers stop between chunks; one still busy past this is a daemon thread, and
+            # requeue_interrupted picks its job up on the next start
+            thread.join(SHUTDOWN_SECONDS)
+        self._threads = []
+
+    def requeue_interrupted(self):
+        """Anything still marked running was interrupted by the last shutdown, resume it"""
+        with Session(self.engine) as session, session.begin():
+            session.execute(
+                update(Job).where(Job.status == RUNNING).values(status=QUEUED)
+            )
+
+    def notify(self):
+        """Skip the poll interval after a job has been enqueued"""
+        self._wake.set()
+
+    def run_pending(self) -> bool:
+        """Claim and run one queued job; False when the queue is empty"""
+        job_id = self._claim()
+        if job_id is None:
+            return False
+        try:
+            self._run(job_id)
+        except Exception as exc:
+            logger.exception("Job %s failed", job_id)
+            with Session(self.engine) as session, session.begin():
+                job = session.get_one(Job, job_id)
+                job.status = FAILED
+                job.error = str(exc)[:500]
+        return True
+
+    def _work(self):
+        while not self._stopping.is_set():
+            if not self.run_pending():
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+    def _claim(self) -> int | None:
+        with Session(self.engine) as session, session.begin():
+            for job_id in session.scalars(
+                select(Job.id)
+                .where(Job.status == QUEUED)
+                .order_by(Job.id.asc())
+                .limit(self.workers)
+            ):
+                # Conditional update so two workers never claim the same job
+                claimed = session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == QUEUED)
+                    .values(status=RUNNING)
+                )
+                if claimed.rowcount == 1:
+                    return job_id
+        return None
+
+    def _run(self, job_id: int):
+        with Session(self.engine) as session:
+            kind = session.get_one(Job, job_id).kind
+        if kind == IMPORT:
+            self._run_import(job_id)
+        elif kind == APPLY_RULES:
+            self._run_apply_rules(job_id)
+        else:
+            raise ValueError(f"Unknown job kind {kind}")
+
+    def _run_import(self, job_id: int):
+        with Session(self.engine) as session:
+            job = session.get_one(Job, job_id)
+            with metrics.timer("parse_csv"):
+                transactions = parse_csv(io.BytesIO(job.source_file.data))
+            position = job.checkpoint
+        # Read before the chunks commit, committed rows are expired and detached
+        reported = reported_end_of_day(transactions)
+
+        # Parsing is deterministic, so the checkpoint indexes the same rows after a restart
+        while position < len(transactions):
+            if self._stopping.is_set():
+                self._interrupt(job_id)
+                return
+            chunk = transactions[position : position + IMPORT_CHUNK_SIZE]
+            position = serialized_write_sync(
+                self.engine, self._import_chunk, job_id, chunk, len(transactions)
+            )
+        serialized_write_sync(self.engine, self._calibrate_balances, job_id, reported)
+        self._finish(job_id)
+
+    def _import_chunk(self, job_id: int, chunk: List[Transaction], total: int) -> int:
+        with metrics.timer("import_insert"), Session(
+            self.engine
+        ) as session, session.begin():
+            job = session.get_one(Job, job_id)
+            # Rows from earlier imports (or overlapping files) are skipped, not re-inserted
+            new_transactions, _ = drop_known(session, job.account_id, chunk)
+            for transaction in new_transactions:
+                transaction.account_id = job.account_id
+                transaction.source_file_id = job.source_file_id
+                session.add(transaction)
+            add_to_checkpoints(session, job.account_id, new_transactions)
+            job.checkpoint += len(chunk)
+            job.progress = job.checkpoint
+            job.total = total
+            touch_accounts(session, job.account_id)
+            return job.checkpoint
+
+    def _calibrate_balances(self, job_id: int, reported: Dict[date, float]):
+        # Needs the whole file, a chunk boundary could split the latest reported day
+        with Session(self.engine) as session, session.begin():
+            account_id = session.get_one(Job, job_id).account_id
+            calibrate_checkpoints(session, account_id, reported)
+            touch_accounts(session, account_id)
+
+    def _run_apply_rules(self, job_id: int):
+        while serialized_write_sync(self.engine, self._apply_rules_chunk, job_id):
+            if self._stopping.is_set():
+                self._interrupt(job_id)
+                return
+        self._finish(job_id)
+
+    def _apply_rules_chunk(self, job_id: int) -> bool:
+        with metrics.timer("apply_rules"), Session(
+            self.engine
+        ) as session, session.begin():
+            job = session.get_one(Job, job_id)
+            if job.total is None:
+                job.total = session.query(Rule).count()
+            rules = (
+                session.query(Rule)
+                .filter(Rule.id > job.checkpoint)
+                .order_by(Rule.id.asc())
+                .limit(RULE_CHUNK_SIZE)
+                .all()
+            )
+            updated = 0
+            for rule in rules:
+                updated += len(apply_rule(session, job.account_id, rule))
+            if rules:
+                job.checkpoint = rules[-1].id
+                job.progress += len(rules)
+            if updated:
+                touch_accounts(session, job.account_id)
+            return len(rules) == RULE_CHUNK_SIZE
+
+    def _interrupt(self, job_id: int):
+        """Hand a job back to the queue at its last committed chunk, for the next start to resume"""
+        with Session(self.engine) as session, session.begin():
+            session.get_one(Job, job_id).status = QUEUED
+
+    def _finish(self, job_id: int):
+        with Session(self.engine) as session, session.begin():
+            job = session.get_one(Job, job_id)
+            job.status = DONE
+            if job.total is None:
+                job.total = job.progress
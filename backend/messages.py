@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List
 
 from pydantic import BaseModel
@@ -16,14 +16,23 @@ class AccountData(ModelWithID):
     group: str
 
 
+class CategorySuggestion(BaseModel):
+    category_id: int
+    # Between 0 and 1, how consistently the description's words were filed under the category
+    score: float
+
+
 class TransactionData(ModelWithID):
     init_date: datetime | None = None
     post_date: datetime
     verified_at: datetime | None = None
     description: str
+    description_key: str | None = None
     amount: float
     account_id: int
     category_id: int | None = None
+    # Only filled in for uncategorized transactions on listings
+    suggestions: List[CategorySuggestion] = []
 
 
 class PostAccountRequest(BaseModel):
@@ -40,10 +49,12 @@ class UpdateTransactionRequest(BaseModel):
     newCategoryName: str | None = None
     superId: int | None = None
     newSuperName: str | None = None
+    # Also categorize every uncategorized, unverified transaction with the same description key
+    apply_to_group: bool = False
 
 
 class UpdateTransactionResponse(TransactionData):
-    pass
+    group_updated: int = 0
 
 
 class GetTransactionsResponse(BaseModel):
@@ -98,3 +109,61 @@ class TransactionUpdates(BaseModel):
 
 class ApplyRulesResponse(BaseModel):
     updated_transactions: List[TransactionUpdates]
+    # On previews, uncategorized transactions no rule matched, with their suggestions
+    unmatched_transactions: List[TransactionData] = []
+
+
+class JobData(ModelWithID):
+    kind: str
+    status: str
+    account_id: int
+    progress: int
+    total: int | None = None
+    error: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class BalanceData(BaseModel):
+    day: date
+    balance: float
+
+
+class GetBalanceResponse(BaseModel):
+    on: date
+    balance: float
+    # Day of the checkpoint the balance was read from, None before the first transaction
+    as_of: date | None = None
+
+
+class GetBalanceHistoryResponse(BaseModel):
+    opening_balance: float
+    balances: List[BalanceData]
+
+
+class UncategorizedGroup(BaseModel):
+    description_key: str
+    count: int
+
+
+class GetUncategorizedResponse(BaseModel):
+    transactions: List[TransactionData]
+    groups: List[UncategorizedGroup]
+    # Pass back as after_date/after_id for the next page, None on the last page
+    next_after_date: datetime | None = None
+    next_after_id: int | None = None
+
+
+class NearDuplicateData(BaseModel):
+    transaction: TransactionData
+    # A previously stored transaction, or another row of the same file
+    existing_id: int
+
+
+class ImportResponse(BaseModel):
+    description: str | None = None
+    total: int
+    added: int
+    skipped: int
+    # Same amount and merchant as another transaction a few days apart, likely a pending/posted pair
+    possible_duplicates: List[NearDuplicateData]
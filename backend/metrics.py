@@ -0,0 +1,289 @@
+### Opt-in request profiling and hot-path instrumentation
+#
+# Enable with BUDGET_METRICS=1. Each request is then timed per route, SQL statements are
+# counted and timed through SQLAlchemy cursor events, and the totals are exposed in the
+# Prometheus text format on /metrics. With BUDGET_PROFILE=1 as well, sending "X-Profile: 1"
+# with a request dumps a cProfile of that request into BUDGET_PROFILE_DIR (a temp directory by
+# default). Only one request is profiled at a time, overlapping ones are served unprofiled.
+
+import cProfile
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import Engine, event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from database.engine import writer_profiles
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("BUDGET_METRICS", "").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label set, rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        # Layout: one counter per bucket, then +Inf, then the running sum
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                labels = _format_labels(key + (("le", str(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {int(cumulative)}")
+            labels = _format_labels(key)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {int(cumulative)}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {self.value}",
+        ]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+request_duration = Histogram(
+    "budget_request_duration_seconds",
+    "Request latency by route",
+    LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "budget_request_sql_queries",
+    "SQL statements executed per request",
+    QUERY_COUNT_BUCKETS,
+)
+request_sql_duration = Histogram(
+    "budget_request_sql_duration_seconds",
+    "Time spent in SQL per request",
+    LATENCY_BUCKETS,
+)
+stage_duration = Histogram(
+    "budget_stage_duration_seconds",
+    "Duration of instrumented hot-path stages",
+    LATENCY_BUCKETS,
+)
+queries_total = Counter(
+    "budget_sql_queries_total", "SQL statements executed, including outside requests"
+)
+
+REGISTRY = [
+    request_duration,
+    request_queries,
+    request_sql_duration,
+    stage_duration,
+    queries_total,
+]
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    sql_seconds: float = 0.0
+
+
+_current_request: ContextVar[RequestStats | None] = ContextVar(
+    "budget_request_stats", default=None
+)
+
+# The interpreter runs one profiler at a time (Python 3.12 refuses a second one outright)
+_profile_lock = threading.Lock()
+
+
+@contextmanager
+def timer(stage: str) -> Iterator[None]:
+    """Record the duration of a hot-path stage, e.g. parse_csv or the import insert"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=stage)
+
+
+# The start time lives on the statement's execution context, which is discarded with it when
+# the statement raises and after_cursor_execute never runs
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.budget_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.budget_query_start
+    queries_total.inc()
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware so the per-request stats share the endpoint's context"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.profile_dir = os.environ.get("BUDGET_PROFILE_DIR", tempfile.gettempdir())
+        profiling = os.environ.get("BUDGET_PROFILE", "").lower()
+        self.profiling = profiling in ("1", "true", "yes")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        profiler = None
+        wants_profile = dict(scope["headers"]).get(b"x-profile") or b""
+        if self.profiling and wants_profile.lower() in (b"1", b"true"):
+            if _profile_lock.acquire(blocking=False):
+                profiler = cProfile.Profile()
+                writer_token = writer_profiles.set([])
+            else:
+                logger.warning(
+                    "Not profiling %s, another request is being profiled", scope["path"]
+                )
+        profile_path = None
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            nonlocal profile_path
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                headers = list(message.get("headers", []))
+                timing = (
+                    f"app;dur={elapsed * 1000:.1f}, "
+                    f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.queries} queries"'
+                )
+                headers.append((b"server-timing", timing.encode()))
+                if profiler is not None:
+                    profiler.disable()
+                    profile_path = self._dump_profile(
+                        profiler, writer_profiles.get(), scope
+                    )
+                    headers.append((b"x-profile-file", profile_path.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            if profiler is not None:
+                profiler.enable()
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if profiler is not None:
+                if profile_path is None:
+                    profiler.disable()
+                writer_profiles.reset(writer_token)
+                _profile_lock.release()
+            _current_request.reset(token)
+            route = scope.get("route")
+            labels = {
+                "method": scope["method"],
+                "route": getattr(route, "path", "unmatched"),
+            }
+            request_duration.observe(time.perf_counter() - start, **labels)
+            request_queries.observe(stats.queries, **labels)
+            request_sql_duration.observe(stats.sql_seconds, **labels)
+
+    def _dump_profile(
+        self,
+        profiler: cProfile.Profile,
+        thread_profiles: List[cProfile.Profile],
+        scope: Scope,
+    ) -> str:
+        name = scope["path"].strip("/").replace("/", "_") or "root"
+        # Suffixed so concurrent or same-second requests to one route don't overwrite each other
+        path = os.path.join(
+            self.profile_dir,
+            f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof",
+        )
+        stats = pstats.Stats(profiler)
+        for thread_profile in thread_profiles:
+            stats.add(thread_profile)
+        stats.dump_stats(path)
+        logger.info("Wrote profile for %s to %s", scope["path"], path)
+        return path
+
+
+def metrics_endpoint() -> PlainTextResponse:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
+    )
+
+
+def install(app: FastAPI):
+    """Attach the middleware, SQL hooks and /metrics route; must run before the app starts"""
+    global ENABLED
+    ENABLED = True
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics_endpoint, include_in_schema=False)
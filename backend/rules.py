@@ -0,0 +1,59 @@
+### Applying categorization rules to an account's transactions
+
+import logging
+from typing import List
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from backend.messages import TransactionData, TransactionUpdates
+from backend.suggestions import Categorization, record_categorizations
+from database.models import Rule, Transaction
+
+logger = logging.getLogger(__name__)
+
+
+def apply_rule(
+    session: Session, account_id: int, rule: Rule
+) -> List[TransactionUpdates]:
+    """Move every matching transaction into the rule's category, returning what changed"""
+    updated_transactions: List[TransactionUpdates] = []
+    if rule.category_id is None:
+        logger.warning("Invalid rule %s with contains %s", rule.id, rule.contains)
+        return updated_transactions
+
+    filter_clause = []
+    filter_clause.append(Transaction.account_id == account_id)
+    filter_clause.append(
+        or_(
+            Transaction.category_id != rule.category_id,
+            Transaction.category_id == None,
+        )
+    )
+    filter_clause.append(
+        Transaction.description.like(f"%{rule.contains}%")
+        if rule.case_sensitive
+        else Transaction.description.ilike(f"%{rule.contains}%")
+    )
+    records_to_update = session.query(Transaction).filter(*filter_clause).all()
+    record_categorizations(
+        session,
+        account_id,
+        [
+            Categorization(record.description_key, record.category_id, rule.category_id)
+            for record in records_to_update
+        ],
+    )
+    for record in records_to_update:
+        updated_transactions.append(
+            TransactionUpdates(
+                transaction=TransactionData.model_validate(
+                    record, from_attributes=True
+                ),
+                old_category=(record.category.name if record.category else "None"),
+                new_category=rule.category.name,
+            )
+        )
+
+        record.category_id = rule.category_id
+    return updated_transactions
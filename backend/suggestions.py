@@ -0,0 +1,148 @@
+### Category suggestions learned from an account's own categorized transactions
+#
+# category_token counts, per account, how often each description token ended up in each category.
+# Every place that changes a transaction's category reports it through record_categorizations, so
+# the index stays current without rescanning history, and ranking a page of transactions is one
+# primary key lookup for its tokens followed by in-memory scoring.
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend.messages import CategorySuggestion, TransactionData
+from database.models import CategoryToken, Transaction, description_tokens
+
+MAX_SUGGESTIONS = 3
+
+# Dialects whose INSERT supports ON CONFLICT DO UPDATE, which the count upsert relies on
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+class Categorization(NamedTuple):
+    description_key: str
+    old_category_id: int | None
+    new_category_id: int | None
+    # Transactions moved at once, e.g. a whole description group
+    count: int = 1
+
+
+def record_categorizations(
+    session: Session, account_id: int, changes: Iterable[Categorization]
+):
+    """Move token counts from each change's old category to its new one"""
+    deltas: Dict[Tuple[str, int], int] = defaultdict(int)
+    for change in changes:
+        if change.old_category_id == change.new_category_id or change.count == 0:
+            continue
+        for token in description_tokens(change.description_key):
+            if change.old_category_id is not None:
+                deltas[(token, change.old_category_id)] -= change.count
+            if change.new_category_id is not None:
+                deltas[(token, change.new_category_id)] += change.count
+    increments = [
+        {"token": token, "category_id": category_id, "count": delta}
+        for (token, category_id), delta in deltas.items()
+        if delta > 0
+    ]
+    # Bind names must not shadow the columns the UPDATE sets
+    decrements = [
+        {"b_token": token, "b_category_id": category_id, "b_delta": delta}
+        for (token, category_id), delta in deltas.items()
+        if delta < 0
+    ]
+
+    # Counts only ever change in SQL, so concurrent categorizations add up instead of
+    # overwriting each other, and two first sightings of a key can't collide
+    table = CategoryToken.__table__
+    if increments:
+        dialect = session.get_bind().dialect.name
+        if dialect not in _UPSERT_INSERTS:
+            raise NotImplementedError(
+                f"Category suggestions need INSERT ... ON CONFLICT, not available for {dialect}"
+            )
+        statement = _UPSERT_INSERTS[dialect](table).values(account_id=account_id)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[table.c.account_id, table.c.token, table.c.category_id],
+                set_={"count": table.c.count + statement.excluded.count},
+            ),
+            increments,
+        )
+    if decrements:
+        session.execute(
+            update(table)
+            .where(
+                table.c.account_id == account_id,
+                table.c.token == bindparam("b_token"),
+                table.c.category_id == bindparam("b_category_id"),
+            )
+            .values(count=table.c.count + bindparam("b_delta")),
+            decrements,
+        )
+        session.execute(
+            delete(table).where(
+                table.c.account_id == account_id,
+                table.c.token.in_({row["b_token"] for row in decrements}),
+                table.c.count <= 0,
+            )
+        )
+
+
+def suggest_categories(
+    session: Session, account_id: int, transactions: List[Transaction]
+) -> Dict[int, List[CategorySuggestion]]:
+    """Ranked suggestions for the uncategorized transactions, keyed by transaction id"""
+    tokens_by_id = {
+        transaction.id: description_tokens(transaction.description_key)
+        for transaction in transactions
+        if transaction.category_id is None
+    }
+    all_tokens = {token for tokens in tokens_by_id.values() for token in tokens}
+    if not all_tokens:
+        return {}
+
+    index: Dict[str, Dict[int, int]] = defaultdict(dict)
+    for token, category_id, count in session.execute(
+        select(
+            CategoryToken.token, CategoryToken.category_id, CategoryToken.count
+        ).where(
+            CategoryToken.account_id == account_id,
+            CategoryToken.token.in_(all_tokens),
+        )
+    ):
+        index[token][category_id] = count
+
+    suggestions: Dict[int, List[CategorySuggestion]] = {}
+    for transaction_id, tokens in tokens_by_id.items():
+        # Each token votes with its category distribution, so generic words
+        # spread across many categories count for little
+        scores: Dict[int, float] = defaultdict(float)
+        for token in tokens:
+            counts = index.get(token)
+            if not counts:
+                continue
+            total = sum(counts.values())
+            for category_id, count in counts.items():
+                scores[category_id] += count / total
+        ranked = sorted(scores.items(), key=lambda score: (-score[1], score[0]))
+        suggestions[transaction_id] = [
+            CategorySuggestion(category_id=category_id, score=score / len(tokens))
+            for category_id, score in ranked[:MAX_SUGGESTIONS]
+        ]
+    return suggestions
+
+
+def transaction_messages(
+    session: Session, account_id: int, transactions: List[Transaction]
+) -> List[TransactionData]:
+    """TransactionData for a page of transactions, uncategorized ones carrying their suggestions"""
+    suggestions = suggest_categories(session, account_id, transactions)
+    messages = []
+    for transaction in transactions:
+        message = TransactionData.model_validate(transaction, from_attributes=True)
+        message.suggestions = suggestions.get(transaction.id, [])
+        messages.append(message)
+    return messages
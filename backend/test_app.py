@@ -0,0 +1,105 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from database.models import Supercategory
+
+
+def test_transactions_not_modified(client: TestClient, account_id: int):
+    url = f"/account/{account_id}/transactions"
+    first = client.get(url)
+    assert first.status_code == 200
+    assert len(first.json()["transactions"]) == 3
+    etag = first.headers["etag"]
+
+    repeat = client.get(url, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.headers["etag"] == etag
+
+    since = client.get(
+        url, headers={"If-Modified-Since": first.headers["last-modified"]}
+    )
+    assert since.status_code == 304
+
+
+def test_transactions_etag_changes_on_update(client: TestClient, account_id: int):
+    url = f"/account/{account_id}/transactions"
+    first = client.get(url)
+    transaction = first.json()["transactions"][0]
+    transaction["category_id"] = 1
+
+    updated = client.put("/transactions", json={"transaction": transaction})
+    assert updated.status_code == 200
+
+    second = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+def test_categories_not_modified(client: TestClient, account_id: int):
+    first = client.get("/categories")
+    assert first.status_code == 200
+
+    repeat = client.get("/categories", headers={"If-None-Match": first.headers["etag"]})
+    assert repeat.status_code == 304
+
+
+def test_transactions_unknown_account(client: TestClient, engine):
+    assert client.get("/account/404/transactions").status_code == 404
+
+
+def test_categories_etag_changes_without_accounts(client: TestClient, engine):
+    with Session(engine) as session, session.begin():
+        food = Supercategory(name="Food")
+        session.add(food)
+        session.flush()
+        food_id = food.id
+
+    first = client.get("/categories")
+    assert first.json()["categories"] == []
+
+    created = client.post(
+        "/category",
+        json={
+            "name": "Dining",
+            "supercategory_id": food_id,
+            "supercategory_name": None,
+        },
+    )
+    assert created.status_code == 200
+
+    second = client.get("/categories", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert [category["name"] for category in second.json()["categories"]] == ["Dining"]
+
+
+def test_modified_within_same_second(client: TestClient, account_id: int):
+    url = f"/account/{account_id}/transactions"
+    first = client.get(url)
+    transaction = first.json()["transactions"][0]
+    transaction["category_id"] = 1
+    assert client.put("/transactions", json={"transaction": transaction}).is_success
+
+    # Last-Modified only has whole seconds and the edit may share one with the first read,
+    # the ETag still tells the versions apart and takes precedence
+    second = client.get(
+        url,
+        headers={
+            "If-None-Match": first.headers["etag"],
+            "If-Modified-Since": first.headers["last-modified"],
+        },
+    )
+    assert second.status_code == 200
+    assert second.json()["transactions"][0]["category_id"] == 1
+
+
+def test_not_modified_since_after_edit(client: TestClient, account_id: int):
+    url = f"/account/{account_id}/transactions"
+    transaction = client.get(url).json()["transactions"][0]
+    transaction["category_id"] = 1
+    assert client.put("/transactions", json={"transaction": transaction}).is_success
+
+    edited = client.get(url)
+    since = client.get(
+        url, headers={"If-Modified-Since": edited.headers["last-modified"]}
+    )
+    assert since.status_code == 304
@@ -0,0 +1,155 @@
+import random
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from backend.balances import balance_on, record_transactions
+from database.models import Account, BalanceCheckpoint, Transaction
+from database.synthetic import generate_csv
+
+
+def _transaction(day: int, amount: float, balance: float | None = None):
+    return Transaction(
+        post_date=datetime(2024, 1, 1) + timedelta(days=day),
+        description=f"ROW {day} {amount}",
+        amount=amount,
+        balance=balance,
+    )
+
+
+def test_out_of_order_inserts_match_full_sum(engine: Engine):
+    rng = random.Random(3)
+    rows = [_transaction(rng.randint(0, 60), rng.randint(-50, 50)) for _ in range(200)]
+
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        # Three imports, the later ones reaching back before the earlier ones
+        for batch in (rows[120:], rows[:40], rows[40:120]):
+            record_transactions(session, account.id, batch)
+
+        for day in range(61):
+            on = date(2024, 1, 1) + timedelta(days=day)
+            expected = sum(row.amount for row in rows if row.post_date.date() <= on)
+            checkpoint = balance_on(session, account.id, on)
+            assert abs((checkpoint.balance if checkpoint else 0.0) - expected) < 1e-6
+
+
+def test_reported_balance_calibrates_checkpoints(engine: Engine):
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        # Newest first, the way checking exports list them
+        record_transactions(
+            session,
+            account.id,
+            [
+                _transaction(2, -20, 980),
+                _transaction(1, -100, 1000),
+                _transaction(0, 50),
+            ],
+        )
+
+        assert balance_on(session, account.id, date(2024, 1, 3)).balance == 980
+        assert (
+            session.get(BalanceCheckpoint, (account.id, date(2024, 1, 1))).balance
+            == 1100
+        )
+
+
+def test_older_statement_after_newer(engine: Engine):
+    # The bank reports 1100 after January's +100 and 1150 after February's +50
+    january = [_transaction(14, 100, 1100)]
+    february = [_transaction(45, 50, 1150)]
+
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        record_transactions(session, account.id, february)
+        record_transactions(session, account.id, january)
+
+        assert balance_on(session, account.id, date(2024, 1, 15)).balance == 1100
+        assert balance_on(session, account.id, date(2024, 2, 15)).balance == 1150
+        assert account.opening_balance == 1000
+
+
+def test_statement_filling_a_gap(engine: Engine):
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        record_transactions(session, account.id, [_transaction(14, 100, 1100)])
+        # March's reported balance already includes the February row imported last
+        record_transactions(session, account.id, [_transaction(74, 20, 1170)])
+        record_transactions(session, account.id, [_transaction(45, 50, 1150)])
+
+        assert [
+            balance_on(session, account.id, date(2024, month, 15)).balance
+            for month in (1, 2, 3)
+        ] == [1100, 1150, 1170]
+
+
+def test_older_statement_without_balances(engine: Engine):
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        record_transactions(session, account.id, [_transaction(45, 50, 1150)])
+        # No reported balance, but February's reported balance already includes January
+        record_transactions(
+            session, account.id, [_transaction(10, 30), _transaction(14, 70)]
+        )
+
+        assert balance_on(session, account.id, date(2024, 1, 11)).balance == 1030
+        assert balance_on(session, account.id, date(2024, 1, 15)).balance == 1100
+        assert balance_on(session, account.id, date(2024, 2, 15)).balance == 1150
+        assert account.opening_balance == 1000
+
+        # A later row follows on from February's pinned balance
+        record_transactions(session, account.id, [_transaction(50, -25)])
+        assert balance_on(session, account.id, date(2024, 2, 20)).balance == 1125
+
+
+def test_balance_endpoints_after_import(client: TestClient, engine: Engine):
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        account_id = account.id
+
+    response = client.post(
+        f"/account/{account_id}/import",
+        files={"uploadFile": ("synthetic.csv", generate_csv(5, 300), "text/csv")},
+    )
+    assert response.status_code == 200
+
+    history = client.get(f"/account/{account_id}/balances").json()
+    # generate_csv starts the account at 5000 before its first row
+    first = history["balances"][0]
+    with Session(engine) as session:
+        first_day_total = sum(
+            transaction.amount
+            for transaction in session.query(Transaction).filter(
+                Transaction.account_id == account_id
+            )
+            if transaction.post_date.date() == date.fromisoformat(first["day"])
+        )
+    assert abs(first["balance"] - (5000 + first_day_total)) < 0.01
+
+    latest = history["balances"][-1]
+    on = client.get(
+        f"/account/{account_id}/balance", params={"on": "2099-01-01"}
+    ).json()
+    assert on["as_of"] == latest["day"]
+    assert on["balance"] == latest["balance"]
+
+    # Before the first row the account holds the opening balance calibration worked out
+    before = client.get(f"/account/{account_id}/balance", params={"on": "2000-01-01"})
+    assert before.json()["as_of"] is None
+    assert abs(before.json()["balance"] - 5000) < 0.01
+    assert abs(history["opening_balance"] - 5000) < 0.01
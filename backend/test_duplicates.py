@@ -0,0 +1,111 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from database.models import Account, Transaction
+from database.synthetic import generate_csv
+
+
+def _empty_account(engine: Engine) -> int:
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        session.add(account)
+        session.flush()
+        return account.id
+
+
+def _import(client: TestClient, account_id: int, data: bytes) -> dict:
+    response = client.post(
+        f"/account/{account_id}/import",
+        files={"uploadFile": ("upload.csv", data, "text/csv")},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_reimport_skips_known_rows(client: TestClient, engine: Engine):
+    account_id = _empty_account(engine)
+    data = generate_csv(3, 400)
+
+    first = _import(client, account_id, data)
+    assert first["added"] == first["total"] == 400
+    second = _import(client, account_id, data)
+    assert second["added"] == 0
+    assert second["skipped"] == 400
+    assert second["possible_duplicates"] == []
+
+    with Session(engine) as session:
+        assert (
+            session.query(Transaction)
+            .filter(Transaction.account_id == account_id)
+            .count()
+            == 400
+        )
+
+
+def test_repeated_charges_are_numbered(client: TestClient, engine: Engine):
+    account_id = _empty_account(engine)
+    header = "Details,Posting Date,Description,Amount,Type,Balance\n"
+    fee = "DEBIT,08/05/2024,ATM FEE,-2.50,FEE_TRANSACTION,\n"
+
+    assert _import(client, account_id, (header + fee * 2).encode())["added"] == 2
+    # A later statement overlapping the first, with a third identical fee that day
+    result = _import(client, account_id, (header + fee * 3).encode())
+    assert result["added"] == 1
+    assert result["skipped"] == 2
+
+    with Session(engine) as session:
+        rows = session.query(Transaction).filter(Transaction.account_id == account_id)
+        assert sorted(row.occurrence for row in rows) == [0, 1, 2]
+        assert {row.description for row in rows} == {"ATM FEE"}
+
+
+def test_near_duplicate_flagged(client: TestClient, engine: Engine):
+    account_id = _empty_account(engine)
+    with Session(engine) as session, session.begin():
+        pending = Transaction(
+            post_date=datetime(2024, 8, 1),
+            description="AMAZON MKTPL PENDING",
+            amount=-42.17,
+            account_id=account_id,
+        )
+        session.add(pending)
+        session.flush()
+        pending_id = pending.id
+
+    data = (
+        "Details,Posting Date,Description,Amount,Type,Balance\n"
+        "DEBIT,08/03/2024,AMAZON MKTPL*2K4,-42.17,DEBIT_CARD,\n"
+        "DEBIT,08/20/2024,AMAZON MKTPL*9X1,-42.17,DEBIT_CARD,\n"
+    ).encode()
+    result = _import(client, account_id, data)
+    # Both rows are imported; only the one within the window is flagged for review
+    assert result["added"] == 2
+    assert [
+        (duplicate["transaction"]["description"], duplicate["existing_id"])
+        for duplicate in result["possible_duplicates"]
+    ] == [("AMAZON MKTPL*2K4", pending_id)]
+
+
+def test_pair_within_one_file_flagged(client: TestClient, engine: Engine):
+    account_id = _empty_account(engine)
+    data = (
+        "Details,Posting Date,Description,Amount,Type,Balance\n"
+        "DEBIT,08/02/2024,PENDING SHELL OIL 5741,-38.20,DEBIT_CARD,\n"
+        "DEBIT,08/04/2024,SHELL OIL 57410021,-38.20,DEBIT_CARD,\n"
+        # The same coffee on consecutive days is two purchases, not a pair
+        "DEBIT,08/02/2024,BLUE BOTTLE COFFEE,-5.75,DEBIT_CARD,\n"
+        "DEBIT,08/03/2024,BLUE BOTTLE COFFEE,-5.75,DEBIT_CARD,\n"
+        # Same amount, but an unrelated merchant
+        "DEBIT,08/03/2024,CITY PARKING,-38.20,DEBIT_CARD,\n"
+    ).encode()
+    result = _import(client, account_id, data)
+    assert result["added"] == 5
+    assert len(result["possible_duplicates"]) == 1
+    duplicate = result["possible_duplicates"][0]
+    assert duplicate["transaction"]["description"] == "SHELL OIL 57410021"
+    with Session(engine) as session:
+        matched = session.get_one(Transaction, duplicate["existing_id"])
+        assert matched.description == "PENDING SHELL OIL 5741"
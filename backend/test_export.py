@@ -0,0 +1,54 @@
+import csv
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from backend import export
+from database.models import Category, Transaction
+
+
+def test_export_csv(client: TestClient, engine: Engine, account_id: int, monkeypatch):
+    # Small batches so the body is produced in several chunks
+    monkeypatch.setattr(export, "BATCH_SIZE", 2)
+    with Session(engine) as session, session.begin():
+        session.query(Transaction).filter(
+            Transaction.amount == -10.0
+        ).one().category = session.query(Category).one()
+
+    response = client.get(f"/account/{account_id}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["description"] for row in rows] == [
+        "GROCER #1",
+        "GROCER #2",
+        "GROCER #3",
+    ]
+    assert (rows[0]["category"], rows[0]["supercategory"]) == ("Groceries", "Food")
+    assert rows[1]["category"] == ""
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_export_columnar(client: TestClient, account_id: int, monkeypatch, format: str):
+    pa = pytest.importorskip("pyarrow")
+    monkeypatch.setattr(export, "BATCH_SIZE", 2)
+
+    response = client.get(f"/account/{account_id}/export", params={"format": format})
+    assert response.status_code == 200
+
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(pa.BufferReader(response.content))
+    else:
+        table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 3
+    assert table.column("amount").to_pylist() == [-10.0, -20.0, -30.0]
+
+
+def test_export_unknown_account(client: TestClient, engine: Engine):
+    assert client.get("/account/404/export").status_code == 404
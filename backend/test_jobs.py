@@ -0,0 +1,145 @@
+import io
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from backend import app as app_module
+from backend import jobs
+from backend.csv import parse_csv
+from database.models import Category, Job, Rule, Transaction, TransactionFile
+from database.synthetic import generate_csv
+
+
+def _enqueue_import(engine: Engine, account_id: int, data: bytes) -> int:
+    with Session(engine) as session, session.begin():
+        file = TransactionFile(filename="synthetic.csv", data=data)
+        job = jobs.enqueue_import(session, account_id, file)
+        session.flush()
+        return job.id
+
+
+def _transaction_count(engine: Engine, account_id: int) -> int:
+    with Session(engine) as session:
+        return (
+            session.query(Transaction)
+            .filter(Transaction.account_id == account_id)
+            .count()
+        )
+
+
+def test_import_job_in_chunks(engine: Engine, account_id: int, monkeypatch):
+    monkeypatch.setattr(jobs, "IMPORT_CHUNK_SIZE", 40)
+    job_id = _enqueue_import(engine, account_id, generate_csv(1, 100))
+
+    runner = jobs.JobRunner(engine)
+    assert runner.run_pending()
+    assert not runner.run_pending()
+
+    with Session(engine) as session:
+        job = session.get_one(Job, job_id)
+        assert (job.status, job.progress, job.total) == (jobs.DONE, 100, 100)
+    assert _transaction_count(engine, account_id) == 103
+
+
+def test_import_job_resumes_from_checkpoint(engine: Engine, account_id: int):
+    data = generate_csv(1, 100)
+    job_id = _enqueue_import(engine, account_id, data)
+    runner = jobs.JobRunner(engine)
+
+    # Simulate a crash right after the first 60 rows were committed
+    with Session(engine) as session, session.begin():
+        session.get_one(Job, job_id).status = jobs.RUNNING
+    runner._import_chunk(job_id, parse_csv(io.BytesIO(data))[:60], 100)
+
+    runner.requeue_interrupted()
+    assert runner.run_pending()
+
+    with Session(engine) as session:
+        job = session.get_one(Job, job_id)
+        assert (job.status, job.progress) == (jobs.DONE, 100)
+    assert _transaction_count(engine, account_id) == 103
+
+
+def test_import_job_stops_between_chunks(engine: Engine, account_id: int, monkeypatch):
+    monkeypatch.setattr(jobs, "IMPORT_CHUNK_SIZE", 40)
+    job_id = _enqueue_import(engine, account_id, generate_csv(1, 100))
+    runner = jobs.JobRunner(engine)
+
+    # Shutdown is requested while the first chunk is being written
+    import_chunk = runner._import_chunk
+
+    def import_chunk_then_stop(*args):
+        runner._stopping.set()
+        return import_chunk(*args)
+
+    monkeypatch.setattr(runner, "_import_chunk", import_chunk_then_stop)
+    assert runner.run_pending()
+    with Session(engine) as session:
+        job = session.get_one(Job, job_id)
+        assert (job.status, job.progress) == (jobs.QUEUED, 40)
+
+    assert jobs.JobRunner(engine).run_pending()
+    with Session(engine) as session:
+        assert session.get_one(Job, job_id).status == jobs.DONE
+    assert _transaction_count(engine, account_id) == 103
+
+
+def test_enqueue_unknown_account(client: TestClient, engine: Engine):
+    assert client.post("/account/404/jobs/apply-rules").status_code == 404
+    response = client.post(
+        "/account/404/jobs/import",
+        files={"uploadFile": ("synthetic.csv", generate_csv(1, 5), "text/csv")},
+    )
+    assert response.status_code == 404
+    assert client.get("/account/404/jobs").status_code == 404
+    with Session(engine) as session:
+        assert session.query(Job).count() == 0
+
+
+def test_failed_job_records_error(engine: Engine, account_id: int):
+    job_id = _enqueue_import(
+        engine, account_id, b"Posting Date,Description,Amount\nyesterday,COFFEE,-3.50\n"
+    )
+
+    assert jobs.JobRunner(engine).run_pending()
+    with Session(engine) as session:
+        job = session.get_one(Job, job_id)
+        assert job.status == jobs.FAILED
+        assert job.error
+
+
+def test_apply_rules_job_endpoints(engine: Engine, account_id: int):
+    with Session(engine) as session, session.begin():
+        category = session.query(Category).one()
+        category_id = category.id
+        session.add(
+            Rule(
+                contains="grocer",
+                case_sensitive=False,
+                category=category,
+                account_id=account_id,
+            )
+        )
+
+    with TestClient(app_module.app) as client:
+        response = client.post(f"/account/{account_id}/jobs/apply-rules")
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        for _ in range(50):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] == jobs.DONE:
+                break
+            time.sleep(0.05)
+        assert (job["status"], job["progress"], job["total"]) == (jobs.DONE, 1, 1)
+        assert client.get(f"/account/{account_id}/jobs").json()[0]["id"] == job_id
+
+    with Session(engine) as session:
+        assert (
+            session.query(Transaction)
+            .filter(Transaction.category_id == category_id)
+            .count()
+            == 3
+        )
@@ -0,0 +1,148 @@
+import pstats
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from backend import app as app_module
+from backend import metrics
+from database.synthetic import generate_csv
+
+
+@pytest.fixture
+def install(monkeypatch):
+    """metrics.install switches on process-wide timers and SQL hooks, undone after the test"""
+    monkeypatch.setattr(metrics, "ENABLED", metrics.ENABLED)
+    hooks = [
+        ("before_cursor_execute", metrics._before_cursor_execute),
+        ("after_cursor_execute", metrics._after_cursor_execute),
+    ]
+    already_listening = event.contains(Engine, *hooks[0])
+    yield metrics.install
+    if not already_listening:
+        for name, hook in hooks:
+            event.remove(Engine, name, hook)
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram("test_seconds", "Test", (0.1, 1.0))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5.0, route="/a")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/a"} 3' in lines
+
+
+def test_request_query_counts(install):
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        with metrics.timer("lookup"), engine.connect() as connection:
+            for _ in range(3):
+                connection.execute(text("select 1"))
+        return {"id": item_id}
+
+    install(app)
+    client = TestClient(app)
+
+    response = client.get("/items/7")
+    assert response.status_code == 200
+    assert 'desc="3 queries"' in response.headers["server-timing"]
+
+    exposition = client.get("/metrics").text
+    assert (
+        'budget_request_sql_queries_bucket{method="GET",route="/items/{item_id}",le="5"} 1'
+        in exposition
+    )
+    assert 'budget_stage_duration_seconds_count{stage="lookup"} 1' in exposition
+
+
+def test_profile_single_request(install, tmp_path, monkeypatch):
+    monkeypatch.setenv("BUDGET_PROFILE", "1")
+    monkeypatch.setenv("BUDGET_PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return {"message": "Alive"}
+
+    install(app)
+    client = TestClient(app)
+
+    assert "x-profile-file" not in client.get("/").headers
+    profiled = client.get("/", headers={"X-Profile": "1"})
+    assert profiled.headers["x-profile-file"].startswith(str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Same route within the same second still gets its own file
+    again = client.get("/", headers={"X-Profile": "1"})
+    assert again.headers["x-profile-file"] != profiled.headers["x-profile-file"]
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_profile_opt_in_and_exclusive(install, tmp_path, monkeypatch):
+    monkeypatch.setenv("BUDGET_PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return {"message": "Alive"}
+
+    install(app)
+    response = TestClient(app).get("/", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert "x-profile-file" not in response.headers
+
+    monkeypatch.setenv("BUDGET_PROFILE", "1")
+    app = FastAPI()
+    app.get("/")(root)
+    install(app)
+    client = TestClient(app)
+    # Another request holds the profiler, this one is served without
+    with metrics._profile_lock:
+        response = client.get("/", headers={"X-Profile": "1"})
+    assert response.status_code == 200
+    assert "x-profile-file" not in response.headers
+    assert not list(tmp_path.iterdir())
+
+    assert "x-profile-file" in client.get("/", headers={"X-Profile": "1"}).headers
+
+
+def test_failed_statement_timing(install):
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    install(FastAPI())
+    before = metrics.queries_total.value
+    with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text("select * from missing"))
+        connection.execute(text("select 1"))
+    # Only statements that completed are counted
+    assert metrics.queries_total.value == before + 1
+
+
+def test_profile_covers_writer_thread(
+    install, engine, account_id, tmp_path, monkeypatch
+):
+    monkeypatch.setenv("BUDGET_PROFILE", "1")
+    monkeypatch.setenv("BUDGET_PROFILE_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(app_module.app.router)
+    install(app)
+
+    # On SQLite the import runs on the writer thread, not the one handling the request
+    response = TestClient(app).post(
+        f"/account/{account_id}/import",
+        files={"uploadFile": ("synthetic.csv", generate_csv(1, 20), "text/csv")},
+        headers={"X-Profile": "1"},
+    )
+    assert response.status_code == 200
+    stats = pstats.Stats(response.headers["x-profile-file"])
+    assert any(function == "parse_csv" for _, _, function in stats.stats)
@@ -0,0 +1,144 @@
+from collections import Counter
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from backend.suggestions import Categorization, record_categorizations
+from database.engine import create_default_engine
+from database.models import (
+    Account,
+    Base,
+    Category,
+    CategoryToken,
+    Rule,
+    Supercategory,
+    Transaction,
+    description_tokens,
+)
+from database.synthetic import generate
+
+
+def _index(engine: Engine, account_id: int) -> Counter:
+    with Session(engine) as session:
+        return Counter(
+            {
+                (row.token, row.category_id): row.count
+                for row in session.query(CategoryToken).filter(
+                    CategoryToken.account_id == account_id
+                )
+            }
+        )
+
+
+def _rebuilt_index(engine: Engine, account_id: int) -> Counter:
+    with Session(engine) as session:
+        counts = Counter()
+        for transaction in session.query(Transaction).filter(
+            Transaction.account_id == account_id, Transaction.category_id != None
+        ):
+            for token in description_tokens(transaction.description_key):
+                counts[(token, transaction.category_id)] += 1
+        return counts
+
+
+def test_categorizing_updates_suggestions(
+    client: TestClient, engine: Engine, account_id: int
+):
+    listing = client.get(f"/account/{account_id}/transactions").json()
+    transaction = listing["transactions"][-1]
+    assert all(row["suggestions"] == [] for row in listing["transactions"])
+    with Session(engine) as session:
+        groceries_id = session.query(Category).first().id
+
+    transaction["category_id"] = groceries_id
+    assert client.put("/transactions", json={"transaction": transaction}).is_success
+    listing = client.get(f"/account/{account_id}/transactions").json()
+    for row in listing["transactions"]:
+        if row["id"] != transaction["id"]:
+            assert row["suggestions"] == [{"category_id": groceries_id, "score": 1.0}]
+
+    # Taking the category away again empties the index
+    transaction["category_id"] = None
+    assert client.put("/transactions", json={"transaction": transaction}).is_success
+    assert _index(engine, account_id) == Counter()
+
+
+def test_apply_rules_preview_suggests_unmatched(
+    client: TestClient, engine: Engine, account_id: int
+):
+    with Session(engine) as session, session.begin():
+        groceries_id = session.query(Category).first().id
+        session.add(
+            Rule(
+                contains="GROCER #1",
+                case_sensitive=True,
+                category_id=groceries_id,
+                account_id=account_id,
+            )
+        )
+
+    response = client.post(
+        f"/account/{account_id}/apply-rules", json={"preview": True}
+    ).json()
+    assert len(response["updated_transactions"]) == 1
+    assert sorted(row["description"] for row in response["unmatched_transactions"]) == [
+        "GROCER #2",
+        "GROCER #3",
+    ]
+    assert all(
+        row["suggestions"][0]["category_id"] == groceries_id
+        for row in response["unmatched_transactions"]
+    )
+    # The preview is rolled back, index included
+    assert _index(engine, account_id) == Counter()
+
+
+def test_index_matches_rebuild(client: TestClient, engine: Engine):
+    with Session(engine) as session:
+        dataset = generate(session, seed=7, transactions_per_account=500)
+    account_id = dataset.account_ids[0]
+    assert _index(engine, account_id) == _rebuilt_index(engine, account_id)
+
+    response = client.post(
+        f"/account/{account_id}/apply-rules", json={"preview": False}
+    )
+    assert response.json()["updated_transactions"]
+    assert _index(engine, account_id) == _rebuilt_index(engine, account_id)
+
+
+def test_overlapping_deltas_add_up(tmp_path):
+    # Separate connections, like a job worker and a request, rather than the shared test one
+    engine = create_default_engine(f"sqlite+pysqlite:///{tmp_path / 'budget.db'}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session, session.begin():
+        account = Account(name="checking", group="household")
+        coffee = Category(name="Coffee", supercategory=Supercategory(name="Food"))
+        session.add_all([account, coffee])
+        session.flush()
+        account_id, coffee_id = account.id, coffee.id
+        record_categorizations(
+            session, account_id, [Categorization("blue bottle", None, coffee_id, 3)]
+        )
+
+    def record(session: Session, delta: int):
+        old, new = (None, coffee_id) if delta > 0 else (coffee_id, None)
+        record_categorizations(
+            session, account_id, [Categorization("blue bottle", old, new, abs(delta))]
+        )
+
+    with Session(engine) as worker:
+        # The worker already holds the row it is about to change
+        held = worker.get_one(CategoryToken, (account_id, "blue", coffee_id))
+        assert held.count == 3
+        with Session(engine) as request, request.begin():
+            record(request, 2)
+        record(worker, -1)
+        worker.commit()
+
+    assert _index(engine, account_id) == Counter(
+        {("blue", coffee_id): 4, ("bottle", coffee_id): 4}
+    )
+    with Session(engine) as session, session.begin():
+        record(session, -4)
+    assert _index(engine, account_id) == Counter()
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from database.models import Account, Category, Transaction
+
+
+def _backlog(engine: Engine) -> int:
+    with Session(engine) as session, session.begin():
+        account = Account(name="credit", group="household")
+        session.add(account)
+        session.add_all(
+            [
+                Transaction(
+                    post_date=datetime(2024, 9, 1 + idx % 10),
+                    description=f"STARBUCKS #{1000 + idx}",
+                    amount=-4.5,
+                    account=account,
+                )
+                for idx in range(12)
+            ]
+            + [
+                Transaction(
+                    post_date=datetime(2024, 9, 5),
+                    description="NETFLIX.COM",
+                    amount=-15.49,
+                    account=account,
+                    verified_at=datetime(2024, 9, 6),
+                )
+            ]
+        )
+        session.flush()
+        return account.id
+
+
+def test_uncategorized_keyset_pages(client: TestClient, engine: Engine):
+    account_id = _backlog(engine)
+    seen = []
+    params = {"limit": 5}
+    while True:
+        page = client.get(f"/account/{account_id}/uncategorized", params=params).json()
+        seen.extend(transaction["id"] for transaction in page["transactions"])
+        assert page["groups"] == [{"description_key": "starbucks", "count": 12}]
+        if page["next_after_id"] is None:
+            break
+        params = {
+            "limit": 5,
+            "after_date": page["next_after_date"],
+            "after_id": page["next_after_id"],
+        }
+
+    # Verified rows are out of the queue, and no row repeats across pages
+    assert len(seen) == len(set(seen)) == 12
+
+
+def test_apply_to_group(client: TestClient, engine: Engine, account_id: int):
+    group_account_id = _backlog(engine)
+    page = client.get(f"/account/{group_account_id}/uncategorized").json()
+    transaction = page["transactions"][0]
+    with Session(engine) as session:
+        transaction["category_id"] = session.query(Category).first().id
+
+    response = client.put(
+        "/transactions", json={"transaction": transaction, "apply_to_group": True}
+    )
+    assert response.status_code == 200
+    assert response.json()["group_updated"] == 11
+
+    remaining = client.get(f"/account/{group_account_id}/uncategorized").json()
+    assert remaining["transactions"] == []
+    # Other accounts with similar descriptions are left alone
+    other = client.get(f"/account/{account_id}/uncategorized").json()
+    assert len(other["transactions"]) == 3
+
+
+def test_uncategorized_rejects_bad_paging(client: TestClient, account_id: int):
+    url = f"/account/{account_id}/uncategorized"
+    assert client.get(url, params={"limit": 0}).status_code == 422
+    assert client.get(url, params={"limit": -1}).status_code == 422
+    assert client.get(url, params={"after_id": 3}).status_code == 400
+    assert (
+        client.get(url, params={"after_date": "2024-08-02T00:00:00"}).status_code == 400
+    )
@@ -0,0 +1,89 @@
+### Triage queue for uncategorized transactions
+#
+# Every query here repeats the partial index predicate (category_id IS NULL AND verified_at IS
+# NULL) verbatim, which is what lets both Postgres and SQLite use ix_transaction_uncategorized*.
+
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from backend.suggestions import Categorization, record_categorizations
+from database.models import Transaction
+
+
+def _uncategorized(account_id: int):
+    return and_(
+        Transaction.account_id == account_id,
+        Transaction.category_id == None,
+        Transaction.verified_at == None,
+    )
+
+
+def uncategorized_page(
+    session: Session,
+    account_id: int,
+    limit: int,
+    after_date: datetime | None = None,
+    after_id: int | None = None,
+) -> List[Transaction]:
+    """Newest first, keyset paginated on (post_date, id) so deep pages cost the same as the first"""
+    query = select(Transaction).where(_uncategorized(account_id))
+    if after_date is not None and after_id is not None:
+        query = query.where(
+            or_(
+                Transaction.post_date < after_date,
+                and_(Transaction.post_date == after_date, Transaction.id < after_id),
+            )
+        )
+    return list(
+        session.scalars(
+            query.order_by(Transaction.post_date.desc(), Transaction.id.desc()).limit(
+                limit
+            )
+        )
+    )
+
+
+def group_counts(
+    session: Session, account_id: int, description_keys: List[str]
+) -> Dict[str, int]:
+    """Size of each description group across the whole backlog, not just the current page"""
+    if not description_keys:
+        return {}
+    rows = session.execute(
+        select(Transaction.description_key, func.count(Transaction.id))
+        .where(
+            _uncategorized(account_id),
+            Transaction.description_key.in_(set(description_keys)),
+        )
+        .group_by(Transaction.description_key)
+    )
+    return {description_key: count for description_key, count in rows}
+
+
+def categorize_group(session: Session, transaction: Transaction) -> int:
+    """Give the rest of the transaction's description group its category, returning how many changed"""
+    result = session.execute(
+        update(Transaction)
+        .where(
+            _uncategorized(transaction.account_id),
+            Transaction.description_key == transaction.description_key,
+            Transaction.id != transaction.id,
+        )
+        .values(category_id=transaction.category_id)
+    )
+    record_categorizations(
+        session,
+        transaction.account_id,
+        [
+            Categorization(
+                transaction.description_key,
+                None,
+                transaction.category_id,
+                result.rowcount,
+            )
+        ],
+    )
+    return result.rowcount
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import Session
+
+from backend import app as app_module
+from database import engine as engine_module
+from database.engine import create_default_engine
+from database.models import Base
+from database.synthetic import SyntheticDataset, generate
+
+pytest.importorskip("pytest_benchmark")
+
+# Scale up for a realistic run, e.g. BENCHMARK_TRANSACTIONS=2000000
+TRANSACTIONS = int(os.environ.get("BENCHMARK_TRANSACTIONS", "20000"))
+# Dedicated, throwaway database: the suite creates and drops every table in it
+POSTGRES_URL = os.environ.get("BENCHMARK_POSTGRES_URL")
+
+
+def _backends():
+    yield pytest.param("sqlite", id="sqlite")
+    yield pytest.param(
+        "postgres",
+        id="postgres",
+        marks=pytest.mark.skipif(
+            not POSTGRES_URL, reason="BENCHMARK_POSTGRES_URL not set"
+        ),
+    )
+
+
+@pytest.fixture(scope="session")
+def import_rows() -> int:
+    """Size of a single CSV import, capped so import rounds stay quick at full scale"""
+    return min(TRANSACTIONS, 2000)
+
+
+@pytest.fixture(scope="session", params=list(_backends()))
+def engine(request, tmp_path_factory):
+    if request.param == "sqlite":
+        path = tmp_path_factory.mktemp("bench") / "budget.db"
+        # Same WAL profile as an embedded install
+        engine = create_default_engine(f"sqlite+pysqlite:///{path}")
+    else:
+        engine = create_engine(POSTGRES_URL, future=True)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def dataset(engine: Engine) -> SyntheticDataset:
+    with Session(engine) as session:
+        return generate(session, seed=42, transactions_per_account=TRANSACTIONS)
+
+
+@pytest.fixture(scope="session")
+def client(engine: Engine):
+    previous = engine_module.default_engine
+    engine_module.default_engine = engine
+    yield TestClient(app_module.app)
+    engine_module.default_engine = previous
@@ -0,0 +1,133 @@
+import io
+from itertools import count
+
+from fastapi.testclient import TestClient
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from backend.csv import add_transactions, parse_csv
+from database.models import Account
+from database.synthetic import SyntheticDataset, generate_csv
+
+PER_PAGE = 20
+
+_accounts = count()
+
+
+def _new_account(engine: Engine) -> int:
+    with Session(engine) as session:
+        account = Account(name=f"Benchmark import {next(_accounts)}", group="benchmark")
+        session.add(account)
+        session.commit()
+        return account.id
+
+
+def test_parse_csv(benchmark, import_rows: int):
+    data = generate_csv(seed=7, count=import_rows)
+
+    transactions = benchmark(lambda: parse_csv(io.BytesIO(data)))
+    assert len(transactions) == import_rows
+
+
+def test_add_transactions(
+    benchmark, engine: Engine, dataset: SyntheticDataset, import_rows: int
+):
+    data = generate_csv(seed=7, count=import_rows)
+
+    def setup():
+        session = Session(engine)
+        account = session.get(Account, _new_account(engine))
+        session.commit()
+        return (session, account, parse_csv(io.BytesIO(data))), {}
+
+    def run(session: Session, account: Account, records):
+        add_transactions(session, account, records)
+        session.close()
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+
+
+def test_import_endpoint(
+    benchmark, engine: Engine, client: TestClient, dataset, import_rows: int
+):
+    data = generate_csv(seed=11, count=import_rows)
+
+    def setup():
+        return (_new_account(engine),), {}
+
+    def run(account_id: int):
+        response = client.post(
+            f"/account/{account_id}/import",
+            files={"uploadFile": ("synthetic.csv", data, "text/csv")},
+        )
+        assert response.status_code == 200
+
+    benchmark.pedantic(run, setup=setup, rounds=5)
+
+
+def test_get_transactions_first_page(benchmark, client: TestClient, dataset):
+    account_id = dataset.account_ids[0]
+
+    response = benchmark(client.get, f"/account/{account_id}/transactions")
+    assert response.status_code == 200
+
+
+def test_get_transactions_deep_page(benchmark, client: TestClient, dataset):
+    account_id = dataset.account_ids[0]
+    last_page = dataset.transaction_count // PER_PAGE - 1
+
+    response = benchmark(
+        client.get,
+        f"/account/{account_id}/transactions",
+        params={"page": last_page, "per_page": PER_PAGE},
+    )
+    assert len(response.json()["transactions"]) == PER_PAGE
+
+
+def test_get_transactions_not_modified(benchmark, client: TestClient, dataset):
+    url = f"/account/{dataset.account_ids[0]}/transactions"
+    etag = client.get(url).headers["etag"]
+
+    response = benchmark(client.get, url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_uncategorized_deep_page(benchmark, client: TestClient, dataset):
+    account_id = dataset.account_ids[0]
+    url = f"/account/{account_id}/uncategorized"
+    # Walk to the back of the queue first, keyset pages should not slow down with depth
+    page = client.get(url, params={"limit": 500}).json()
+    cursor = {}
+    while page["next_after_id"] is not None:
+        cursor = {
+            "after_date": page["next_after_date"],
+            "after_id": page["next_after_id"],
+        }
+        page = client.get(url, params={"limit": 500, **cursor}).json()
+
+    response = benchmark(client.get, url, params={"limit": PER_PAGE, **cursor})
+    assert response.status_code == 200
+
+
+def test_export_csv(benchmark, client: TestClient, dataset):
+    url = f"/account/{dataset.account_ids[0]}/export"
+
+    response = benchmark.pedantic(client.get, args=(url,), rounds=3)
+    assert response.status_code == 200
+
+
+def test_get_categories(benchmark, client: TestClient, dataset):
+    response = benchmark(client.get, "/categories")
+    assert response.status_code == 200
+
+
+def test_apply_rules_preview(benchmark, client: TestClient, dataset):
+    account_id = dataset.account_ids[0]
+
+    response = benchmark.pedantic(
+        client.post,
+        args=(f"/account/{account_id}/apply-rules",),
+        kwargs={"json": {"preview": True}},
+        rounds=3,
+    )
+    assert response.status_code == 200
@@ -0,0 +1,104 @@
+### Engine construction, including the embedded SQLite profile
+#
+# Point SQLALCHEMY_CONNECTION_STRING at sqlite+pysqlite:///budget.db for a single-user install
+# without a database server. SQLite connections are switched to WAL so reads never wait on the
+# writer, and writes are funnelled through one thread because SQLite only allows one writer.
+
+import asyncio
+import contextvars
+import cProfile
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypeVar
+
+from sqlalchemy import Engine, create_engine, event
+
+T = TypeVar("T")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Safe with WAL: a power loss can only drop the last commits, never corrupt the file
+    "synchronous": "NORMAL",
+    # Negative values are KiB, so 64 MiB of page cache per connection
+    "cache_size": "-65536",
+    "mmap_size": str(256 * 1024 * 1024),
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+    "busy_timeout": "5000",
+}
+
+default_engine: Engine | None = None
+_writer: ThreadPoolExecutor | None = None
+
+# Set by backend.metrics while a request is profiled. Before Python 3.12 a cProfile only sees the
+# thread that enabled it, so the writer thread records its share into profiles collected here
+writer_profiles: contextvars.ContextVar[List[cProfile.Profile] | None] = (
+    contextvars.ContextVar("budget_writer_profiles", default=None)
+)
+
+
+def is_sqlite(engine: Engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+def create_default_engine(conn_string: str) -> Engine:
+    engine = create_engine(conn_string, future=True)
+    if is_sqlite(engine):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def get_default_engine() -> Engine:
+    global default_engine
+    if default_engine:
+        return default_engine
+    conn_string = os.environ.get("SQLALCHEMY_CONNECTION_STRING")
+    default_engine = create_default_engine(conn_string)
+    return default_engine
+
+
+def _writer_executor() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+    return _writer
+
+
+def _profiled(fn: Callable[..., T], *args) -> T:
+    profiles = writer_profiles.get()
+    # From 3.12 on, the request's profiler already covers every thread
+    if profiles is None or sys.version_info >= (3, 12):
+        return fn(*args)
+    profiler = cProfile.Profile()
+    profiles.append(profiler)
+    profiler.enable()
+    try:
+        return fn(*args)
+    finally:
+        profiler.disable()
+
+
+async def serialized_write(engine: Engine, fn: Callable[..., T], *args) -> T:
+    """Run a write-heavy unit of work, queued behind other writers when the engine is SQLite"""
+    if not is_sqlite(engine):
+        return fn(*args)
+    # Carry the caller's context along so per-request instrumentation still applies
+    context = contextvars.copy_context()
+    return await asyncio.wrap_future(
+        _writer_executor().submit(context.run, _profiled, fn, *args)
+    )
+
+
+def serialized_write_sync(engine: Engine, fn: Callable[..., T], *args) -> T:
+    """Blocking variant of serialized_write for code already running off the event loop"""
+    if not is_sqlite(engine):
+        return fn(*args)
+    return _writer_executor().submit(fn, *args).result()
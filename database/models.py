@@ -1,23 +1,100 @@
-from datetime import datetime
+import hashlib
+import re
+from datetime import date, datetime
 from typing import List
 
 from sqlalchemy import (
+    DDL,
     Boolean,
+    Date,
     DateTime,
     Float,
     ForeignKey,
+    Index,
+    Integer,
     LargeBinary,
     String,
     UniqueConstraint,
+    event,
+    false,
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    mapped_column,
+    relationship,
+    validates,
+)
+from sqlalchemy.sql import func, text
+from sqlalchemy.sql.expression import FunctionElement
+
+# Digits, punctuation and duplicate markers vary between otherwise identical merchants
+_description_noise = re.compile(r"[^a-z]+")
+
+
+def normalize_description(description: str) -> str:
+    """Group key for similar descriptions, e.g. WHOLEFDS MKT #1234 -> wholefds mkt"""
+    key = " ".join(_description_noise.sub(" ", description.lower()).split())
+    return key or description.lower().strip()
+
+
+def description_tokens(description_key: str) -> List[str]:
+    """Words of a description key that say something about the merchant, for category suggestions"""
+    return sorted({token for token in description_key.split() if len(token) >= 3})
+
+
+def transaction_fingerprint(
+    post_date: datetime, description: str, amount: float, occurrence: int
+) -> str:
+    """Identity of an imported row within its account, stable across re-imports of the same file"""
+    identity = "|".join(
+        [post_date.isoformat(), description, f"{float(amount):.2f}", str(occurrence)]
+    )
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+
+class utcnow(FunctionElement):
+    """Current time in UTC as a naive timestamp, matching what the application writes"""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite's CURRENT_TIMESTAMP is already UTC
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    # now() is in the session's time zone, which need not be UTC
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class CatalogVersion(Base):
+    """Single row versioning the categories, supercategories and rules every account shares"""
+
+    __tablename__ = "catalog_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=utcnow())
+
+
+# Seeded on creation so touching the catalog is always a plain UPDATE
+event.listen(
+    CatalogVersion.__table__,
+    "after_create",
+    DDL("INSERT INTO catalog_version (id) VALUES (1)"),
+)
+
+
 class TransactionFile(Base):
     __tablename__ = "transaction_file"
 
@@ -36,6 +113,14 @@ class Account(Base):
     name: Mapped[str] = mapped_column(String(100))
     group: Mapped[str] = mapped_column(String(100))
 
+    # Advanced whenever the account's transactions, categories or rules change, used for HTTP caching
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    data_updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=utcnow())
+    # Balance before the first transaction, as established by the bank-reported balances
+    opening_balance: Mapped[float] = mapped_column(
+        Float, default=0.0, server_default="0"
+    )
+
     transactions: Mapped[List["Transaction"]] = relationship(back_populates="account")
     rules: Mapped[List["Rule"]] = relationship(back_populates="account")
 
@@ -47,7 +132,13 @@ class Transaction(Base):
     init_date: Mapped[datetime | None] = mapped_column(DateTime)
     post_date: Mapped[datetime] = mapped_column(DateTime)
     description: Mapped[str] = mapped_column(String(200))
+    description_key: Mapped[str] = mapped_column(String(200))
     amount: Mapped[float] = mapped_column(Float)
+    # Ordinal among identical (post_date, description, amount) rows, e.g. repeated small fees
+    occurrence: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    fingerprint: Mapped[str] = mapped_column(String(40))
+    # Account balance after this transaction, when the bank's export reports it
+    balance: Mapped[float | None] = mapped_column(Float)
     verified_at: Mapped[datetime | None] = mapped_column(DateTime)
 
     account_id: Mapped[int] = mapped_column(
@@ -66,24 +157,45 @@ class Transaction(Base):
     source_file: Mapped[TransactionFile] = relationship(back_populates="transactions")
 
     __table_args__ = (
+        # Also the index for the batched duplicate lookup during imports
         UniqueConstraint(
-            "post_date", "description", "amount", "account_id", name="_transaction_uc"
+            "account_id", "fingerprint", name="_transaction_fingerprint_uc"
+        ),
+        # Partial indexes only cover the triage backlog, which stays small as rows get categorized
+        Index(
+            "ix_transaction_uncategorized",
+            "account_id",
+            "post_date",
+            "id",
+            postgresql_where=text("category_id IS NULL AND verified_at IS NULL"),
+            sqlite_where=text("category_id IS NULL AND verified_at IS NULL"),
+        ),
+        Index(
+            "ix_transaction_uncategorized_key",
+            "account_id",
+            "description_key",
+            postgresql_where=text("category_id IS NULL AND verified_at IS NULL"),
+            sqlite_where=text("category_id IS NULL AND verified_at IS NULL"),
         ),
     )
 
-    @property
-    def unique_string(self) -> str:
-        """Should roughly match the UniqueConstraint parameters listed above, used for resolving multiple near-duplicate transactions imported from csv"""
-        return "|".join(
-            [
-                str(self.post_date.timestamp()),
-                self.description,
-                str(self.amount),
-                str(self.account_id),
-            ]
+    @validates("description")
+    def _set_description_key(self, key: str, description: str) -> str:
+        self.description_key = normalize_description(description)
+        return description
+
+    def compute_fingerprint(self) -> str:
+        return transaction_fingerprint(
+            self.post_date, self.description, self.amount, self.occurrence or 0
         )
 
 
+@event.listens_for(Transaction, "before_insert")
+def _fill_fingerprint(mapper, connection, target: Transaction):
+    if target.fingerprint is None:
+        target.fingerprint = target.compute_fingerprint()
+
+
 class Category(Base):
     __tablename__ = "category"
 
@@ -124,3 +236,68 @@ class Rule(Base):
         ForeignKey("account.id", name="rule_account_id")
     )
     account: Mapped["Account"] = relationship(back_populates="rules")
+
+
+class Job(Base):
+    """Long-running import or rule application, worked through in committed chunks"""
+
+    __tablename__ = "job"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20))
+    status: Mapped[str] = mapped_column(String(20), index=True)
+
+    # Resume position: rows committed for imports, last applied rule id for apply_rules
+    checkpoint: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    progress: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    total: Mapped[int | None] = mapped_column(Integer)
+    error: Mapped[str | None] = mapped_column(String(500))
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), onupdate=func.now()
+    )
+
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("account.id", name="job_account_id")
+    )
+    account: Mapped[Account] = relationship()
+
+    source_file_id: Mapped[int | None] = mapped_column(
+        ForeignKey("transaction_file.id", name="job_file_id")
+    )
+    source_file: Mapped[TransactionFile] = relationship()
+
+
+class BalanceCheckpoint(Base):
+    """End-of-day running balance, so balance lookups never sum the full history"""
+
+    __tablename__ = "balance_checkpoint"
+
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("account.id", name="balance_checkpoint_account_id"),
+        primary_key=True,
+    )
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    balance: Mapped[float] = mapped_column(Float)
+    # Pinned to a balance the bank reported, later imports never move it
+    reported: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=false()
+    )
+
+
+class CategoryToken(Base):
+    """How many of an account's transactions with a description token were put in a category"""
+
+    __tablename__ = "category_token"
+
+    account_id: Mapped[int] = mapped_column(
+        ForeignKey("account.id", name="category_token_account_id"),
+        primary_key=True,
+    )
+    token: Mapped[str] = mapped_column(String(200), primary_key=True)
+    category_id: Mapped[int] = mapped_column(
+        ForeignKey("category.id", name="category_token_category_id"),
+        primary_key=True,
+    )
+    count: Mapped[int] = mapped_column(Integer)
@@ -0,0 +1,247 @@
+### Seeded synthetic data for benchmarks and tests that cannot use the private sample CSVs
+
+import csv
+import io
+import random
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from database.models import (
+    Account,
+    Category,
+    CategoryToken,
+    Rule,
+    Supercategory,
+    Transaction,
+    description_tokens,
+    normalize_description,
+    transaction_fingerprint,
+)
+
+# (supercategory, category, merchants, typical amount, monthly frequency)
+MERCHANT_PROFILES: List[Tuple[str, str, List[str], float, float]] = [
+    (
+        "Food",
+        "Groceries",
+        ["WHOLEFDS MKT", "TRADER JOE S", "SAFEWAY", "KROGER"],
+        85.0,
+        9,
+    ),
+    (
+        "Food",
+        "Restaurants",
+        ["CHIPOTLE", "STARBUCKS", "DOORDASH", "PANERA BREAD"],
+        22.0,
+        14,
+    ),
+    ("Transport", "Fuel", ["SHELL OIL", "CHEVRON", "COSTCO GAS"], 45.0, 4),
+    ("Transport", "Rideshare", ["UBER TRIP", "LYFT RIDE"], 18.0, 3),
+    (
+        "Home",
+        "Utilities",
+        ["PG&E WEB ONLINE", "COMCAST CABLE", "CITY WATER DEPT"],
+        120.0,
+        3,
+    ),
+    ("Home", "Rent", ["ZELLE PAYMENT TO LANDLORD"], 2100.0, 1),
+    ("Shopping", "Online", ["AMAZON MKTPL", "TARGET.COM", "EBAY O"], 40.0, 6),
+    (
+        "Shopping",
+        "Subscriptions",
+        ["NETFLIX.COM", "SPOTIFY USA", "APPLE.COM/BILL"],
+        12.0,
+        3,
+    ),
+    ("Fees", "Bank fees", ["ATM FEE", "FOREIGN TRANSACTION FEE"], 2.5, 2),
+]
+PAYROLL = "ACME CORP PAYROLL PPD ID: 9999999"
+
+
+@dataclass
+class SyntheticDataset:
+    account_ids: List[int] = field(default_factory=list)
+    category_ids: List[int] = field(default_factory=list)
+    rule_count: int = 0
+    transaction_count: int = 0
+
+
+def _store_number(rng: random.Random) -> str:
+    return f"#{rng.randint(100, 9999)}"
+
+
+def generate_rows(
+    seed: int, count: int, start: datetime = datetime(2015, 1, 1)
+) -> Iterator[Tuple[datetime, str, float]]:
+    """Yield (post_date, description, amount) rows in date order, roughly a household's spending"""
+    rng = random.Random(seed)
+    weights = [profile[4] for profile in MERCHANT_PROFILES]
+    # Average card transactions per day, so `count` rows cover a realistic span
+    per_day = sum(weights) / 30
+    day = start
+    produced = 0
+    while produced < count:
+        if day.day in (1, 15):
+            yield day, PAYROLL, 2400.0
+            produced += 1
+        for _ in range(rng.randint(0, max(1, round(per_day * 2)))):
+            if produced >= count:
+                break
+            _, _, merchants, typical, _ = rng.choices(MERCHANT_PROFILES, weights)[0]
+            merchant = rng.choice(merchants)
+            if typical < 5:
+                # Fees repeat verbatim, which exercises near-duplicate handling
+                description, amount = merchant, -typical
+            else:
+                description = f"{merchant} {_store_number(rng)}"
+                amount = -round(rng.lognormvariate(0, 0.5) * typical, 2)
+            yield day, description, amount
+            produced += 1
+        day += timedelta(days=1)
+
+
+def _numbered_rows(
+    rows: Iterator[Tuple[datetime, str, float]]
+) -> Iterator[Tuple[datetime, str, float, int]]:
+    # Mirrors parse_csv so the rows satisfy _transaction_fingerprint_uc
+    seen: Dict[Tuple[datetime, str, float], int] = {}
+    for post_date, description, amount in rows:
+        key = (post_date, description, amount)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        yield post_date, description, amount, occurrence
+
+
+def generate_csv(
+    seed: int, count: int, start: datetime = datetime(2015, 1, 1)
+) -> bytes:
+    """A checking-account style export, newest first, readable by parse_csv"""
+    rows = list(generate_rows(seed, count, start))
+    balance = 5000.0 + sum(amount for _, _, amount in rows)
+    output = io.StringIO()
+    writer = csv.writer(output, quotechar='"', lineterminator="\n")
+    writer.writerow(
+        ["Details", "Posting Date", "Description", "Amount", "Type", "Balance"]
+    )
+    for post_date, description, amount in reversed(rows):
+        writer.writerow(
+            [
+                "CREDIT" if amount > 0 else "DEBIT",
+                post_date.strftime("%m/%d/%Y"),
+                description,
+                f"{amount:.2f}",
+                "ACH_CREDIT" if amount > 0 else "DEBIT_CARD",
+                f"{balance:.2f}",
+            ]
+        )
+        balance -= amount
+    return output.getvalue().encode("utf-8")
+
+
+def generate(
+    session: Session,
+    seed: int = 0,
+    accounts: int = 1,
+    transactions_per_account: int = 10_000,
+    categorized_fraction: float = 0.6,
+    chunk_size: int = 10_000,
+) -> SyntheticDataset:
+    """Populate accounts, categories, rules and transactions; transactions go in through bulk inserts"""
+    rng = random.Random(seed)
+    dataset = SyntheticDataset()
+
+    categories: Dict[str, Category] = {}
+    supercategories: Dict[str, Supercategory] = {}
+    for super_name, category_name, _, _, _ in MERCHANT_PROFILES:
+        supercategory = supercategories.setdefault(
+            super_name, Supercategory(name=super_name)
+        )
+        categories[category_name] = Category(
+            name=category_name, supercategory=supercategory
+        )
+    session.add_all(categories.values())
+
+    account_rows = [
+        Account(name=f"Synthetic account {idx}", group="synthetic")
+        for idx in range(accounts)
+    ]
+    session.add_all(account_rows)
+    session.flush()
+
+    merchant_categories = {
+        merchant: categories[category_name]
+        for _, category_name, merchants, _, _ in MERCHANT_PROFILES
+        for merchant in merchants
+    }
+    for account in account_rows:
+        for merchant, category in merchant_categories.items():
+            session.add(
+                Rule(
+                    contains=merchant,
+                    case_sensitive=False,
+                    category=category,
+                    account=account,
+                )
+            )
+            dataset.rule_count += 1
+    session.flush()
+
+    for account in account_rows:
+        batch = []
+        # Bulk inserts bypass the app, so the suggestion index is built alongside
+        token_counts: Dict[Tuple[str, int], int] = defaultdict(int)
+        for post_date, description, amount, occurrence in _numbered_rows(
+            generate_rows(seed + account.id, transactions_per_account)
+        ):
+            description_key = normalize_description(description)
+            category_id = None
+            if rng.random() < categorized_fraction:
+                merchant = description.split(" #")[0]
+                category = merchant_categories.get(merchant)
+                category_id = category.id if category else None
+            if category_id is not None:
+                for token in description_tokens(description_key):
+                    token_counts[(token, category_id)] += 1
+            batch.append(
+                {
+                    "account_id": account.id,
+                    "post_date": post_date,
+                    "description": description,
+                    "description_key": description_key,
+                    "amount": amount,
+                    "occurrence": occurrence,
+                    "fingerprint": transaction_fingerprint(
+                        post_date, description, amount, occurrence
+                    ),
+                    "category_id": category_id,
+                }
+            )
+            if len(batch) >= chunk_size:
+                session.execute(insert(Transaction), batch)
+                dataset.transaction_count += len(batch)
+                batch = []
+        if batch:
+            session.execute(insert(Transaction), batch)
+            dataset.transaction_count += len(batch)
+        if token_counts:
+            session.execute(
+                insert(CategoryToken),
+                [
+                    {
+                        "account_id": account.id,
+                        "token": token,
+                        "category_id": category_id,
+                        "count": count,
+                    }
+                    for (token, category_id), count in token_counts.items()
+                ],
+            )
+
+    dataset.account_ids = [account.id for account in account_rows]
+    dataset.category_ids = [category.id for category in categories.values()]
+    session.commit()
+    return dataset
@@ -0,0 +1,20 @@
+import threading
+
+from sqlalchemy import text
+
+from database.engine import create_default_engine, serialized_write_sync
+
+
+def test_sqlite_profile_pragmas(tmp_path):
+    engine = create_default_engine(f"sqlite+pysqlite:///{tmp_path / 'budget.db'}")
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA foreign_keys")).scalar() == 1
+
+
+def test_sqlite_writes_share_one_thread(tmp_path):
+    engine = create_default_engine(f"sqlite+pysqlite:///{tmp_path / 'budget.db'}")
+    first = serialized_write_sync(engine, threading.get_ident)
+    second = serialized_write_sync(engine, threading.get_ident)
+    assert first == second != threading.get_ident()